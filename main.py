@@ -1,13 +1,15 @@
 import pyautogui
 import pydirectinput
-import cv2
 import logging
+import mss
 from src.logger_setup import setup_logger
 from src.config_manager import ConfigManager
-from src.input_handler import press_key, hold_key
+from src.input_handler import press_key, press_key_runs, hold_key
 from src.ocr_processor import OcrProcessor
+from src.timing import precise_sleep, enable_high_resolution_timer, disable_high_resolution_timer
+from src.pixel_utils import color_within_tolerance, saturation as pixel_saturation
+from src.screen_capture import grab_raw
 from src.bot_logic import fuzzy_map_ingredients_to_keys, split_extra_field
-from src.screen_capture import capture_region
 
 class CSD2Bot:
     def __init__(self, config_manager: ConfigManager, ocr_processor: OcrProcessor):
@@ -37,9 +39,27 @@ class CSD2Bot:
         self.expected_color = tuple(trigger_config.get("expected_color_rgb"))
         self.tolerance = trigger_config.get("tolerance", 10)
 
+        # Poll the trigger pixel with a 1x1 grab instead of a full screenshot
+        self._trigger_region = {'left': self.trigger_x, 'top': self.trigger_y, 'width': 1, 'height': 1}
+
+        # All page indicators are read from one grab of the strip spanning them.
+        # Precompute the strip and each indicator's byte offset into the BGRA buffer.
+        self._indicator_region = None
+        self._indicator_offsets = {}
+        if self.page_indicators:
+            xs = [indicator['x'] for indicator in self.page_indicators]
+            ys = [indicator['y'] for indicator in self.page_indicators]
+            left, top = min(xs), min(ys)
+            width = max(xs) - left + 1
+            self._indicator_region = {'left': left, 'top': top, 'width': width, 'height': max(ys) - top + 1}
+            # page_number is 2 or 3, list is 0-indexed
+            for page_number, (x, y) in enumerate(zip(xs, ys), start=2):
+                self._indicator_offsets[page_number] = ((y - top) * width + (x - left)) * 4
+
     def run(self):
         """Main bot loop. Waits for a recipe and processes it."""
         self.log.info(f"Waiting for a new recipe...")
+        self.ocr.clear_panel_cache()
         self._wait_for_recipe_trigger()
 
         self.log.debug(f"Recipe trigger detected. Reading recipe...")
@@ -47,36 +67,41 @@ class CSD2Bot:
 
     def _wait_for_recipe_trigger(self):
         """Waits for the pixel color that indicates a new recipe is available."""
-        while not pyautogui.pixelMatchesColor(self.trigger_x, self.trigger_y, self.expected_color, tolerance=self.tolerance):
-            pyautogui.sleep(self.loop_delay)
-
-    def _is_page_active(self, page_number: int) -> bool:
-        """Checks if an ingredient page indicator is active based on color saturation."""
-        if not self.page_indicators or len(self.page_indicators) < page_number - 1:
-            self.log.error(f"Page indicator for page {page_number} not found in config.")
-            return False
-
-        # page_number is 2 or 3, list is 0-indexed
-        indicator = self.page_indicators[page_number - 2]
-        x, y = indicator['x'], indicator['y']
-        
-        # Capture a small 1x1 region at the indicator's coordinates
-        pixel_roi = {'left': x, 'top': y, 'width': 1, 'height': 1}
-        pixel_img_bgra = capture_region(pixel_roi)
-
-        if pixel_img_bgra is None:
-            self.log.warning(f"Failed to capture pixel for page {page_number} indicator.")
-            return False
+        while True:
+            # grab_raw returns BGRA bytes
+            b, g, r, _ = grab_raw(self._trigger_region)[:4]
+            if color_within_tolerance((r, g, b), self.expected_color, self.tolerance):
+                return
+            self._sleep(self.loop_delay)
 
-        # Convert BGRA to BGR then to HSV
-        pixel_bgr = cv2.cvtColor(pixel_img_bgra, cv2.COLOR_BGRA2BGR)
-        pixel_hsv = cv2.cvtColor(pixel_bgr, cv2.COLOR_BGR2HSV)
-        
-        # Check the saturation value (index 1)
-        saturation = pixel_hsv[0, 0][1]
-        is_active = saturation >= 10
-        self.log.debug(f"Page {page_number} indicator saturation: {saturation}. Active: {is_active}")
-        return is_active
+    def _get_active_pages(self) -> dict:
+        """
+        Checks every page indicator from a single screen grab.
+        Returns a dict mapping page number (2, 3) to whether its indicator is active.
+        """
+        if not self.page_indicators:
+            self.log.error("Page indicators not found in config.")
+            return {}
+
+        try:
+            # mss returns the strip as packed BGRA rows
+            raw = grab_raw(self._indicator_region)
+        except mss.exception.ScreenShotError as e:
+            self.log.warning(f"Failed to capture page indicators: {e}")
+            return {}
+
+        active_pages = {}
+        for page_number, offset in self._indicator_offsets.items():
+            b, g, r = raw[offset:offset + 3]
+            saturation = pixel_saturation(b, g, r)
+            active_pages[page_number] = saturation >= 10
+            self.log.debug("Page %s indicator saturation: %s. Active: %s", page_number, saturation, active_pages[page_number])
+        return active_pages
+
+    def _sleep(self, seconds: float):
+        """Sleeps precisely, checking the PyAutoGUI failsafe first."""
+        pyautogui.failSafeCheck()
+        precise_sleep(seconds)
 
     def _process_page(self, required_steps: list):
         """Processes a single page of ingredients."""
@@ -120,7 +145,7 @@ class CSD2Bot:
         keys_to_press = fuzzy_map_ingredients_to_keys(required_steps, available_on_page, self.input_keys, self.fuzzy_matching_config)
         
         self.log.info(f"Keys to press for this page: {keys_to_press}")
-        press_key(keys_to_press)
+        press_key_runs(keys_to_press)
 
         return False
 
@@ -130,33 +155,19 @@ class CSD2Bot:
         - Assumes any extra steps are on the last active page 
         """
 
-        # Start by assuming the last required page is the highest possible one (page 3, index 2).
-        final_page_candidate = 3
-
-        has_extra_steps = recipe_data[3] != []
-
-        # Iterate downwards from page 3 to page 2 to find the last *required* page.
-        while final_page_candidate > 1:
-
-            if has_extra_steps:
-                # any extra steps are assumed to be on the last active page
-                page_is_required = self._is_page_active(final_page_candidate)
-            else:
-                # if there aren't any extra steps, the last page we need is the last one with instructions
-                page_is_required = recipe_data[final_page_candidate-1] != []
-
-            if page_is_required:
-                # Since we are iterating downwards, the first required page we find is the last one.
-                break
-            else:
-                # This page isn't needed, so the last required page must be before it.
-                final_page_candidate -= 1
-
-        last_page_index = final_page_candidate - 1
+        if recipe_data[3]:
+            # any extra steps are assumed to be on the last active page
+            active_pages = self._get_active_pages()
+            final_page = 3 if active_pages.get(3, False) else (2 if active_pages.get(2, False) else 1)
+        else:
+            # if there aren't any extra steps, the last page we need is the last one with instructions
+            final_page = max((i + 1 for i, page_steps in enumerate(recipe_data[:3]) if page_steps), default=1)
+
+        last_page_index = final_page - 1
         # put extra steps on last available page to prevent extra screen grab
         if recipe_data[3]:
             recipe_data[last_page_index].extend(recipe_data[3])
-        recipe_data = recipe_data[:final_page_candidate]
+        recipe_data = recipe_data[:final_page]
 
         return recipe_data, last_page_index
 
@@ -173,10 +184,10 @@ class CSD2Bot:
                 self._serve_order()
                 return
             self.log.warning("Recipe card detected, but failed to read any recipe text. Skipping this attempt.")
-            pyautogui.sleep(self.loop_delay)
+            self._sleep(self.loop_delay)
             return
         
-        self.log.debug(f"Raw Recipe Data: {recipe_data}")
+        self.log.debug("Raw Recipe Data: %s", recipe_data)
         recipe_data[3] = split_extra_field(recipe_data[3])
 
         recipe_data, last_page_index = self._consolidate_recipe_pages(recipe_data)
@@ -193,7 +204,7 @@ class CSD2Bot:
             if i < last_page_index:
                 self.log.info(f"Turning page...")
                 press_key(self.page_turn_key)
-                pyautogui.sleep(self.page_delay)
+                self._sleep(self.page_delay)
 
         self._serve_order()
 
@@ -201,7 +212,7 @@ class CSD2Bot:
         """Presses the confirm key to serve the order."""
         self.log.info("Recipe complete. Pressing confirm key.")
         press_key(self.confirm_key)
-        pyautogui.sleep(self.loop_delay) # Add a small delay after serving
+        self._sleep(self.loop_delay) # Add a small delay after serving
 
 def main():      
     """Main application entry point."""
@@ -231,6 +242,7 @@ def main():
         log.warning("PyAutoGUI failsafe is disabled.")
         
     bot = CSD2Bot(config_manager, ocr_processor)
+    enable_high_resolution_timer()
 
     try:
         log.info("Bot is running. Press Ctrl+C in the console to exit.")
@@ -244,6 +256,7 @@ def main():
     except Exception as e:
         log.error(f"An unexpected error occurred: {e}", exc_info=True)
     finally:
+        disable_high_resolution_timer()
         log.info("CSD2 Bot shutting down.")
 
 if __name__ == "__main__":
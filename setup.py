@@ -1,20 +1,14 @@
 import cv2
 import numpy as np
-import pyautogui
-from mss import mss
-import pytesseract
-from pytesseract import Output
 from pathlib import Path
 
 from src.config_manager import ConfigManager
-from src.ocr_processor import OcrProcessor
-# Global variable to store points from user clicks
-click_points = []
+from src.screen_capture import grab_image, primary_monitor
 
 
 def mouse_callback(event, x, y, flags, param):
-    """OpenCV mouse callback function to capture click coordinates."""
-    global click_points
+    """OpenCV mouse callback function to capture click coordinates into param['points']."""
+    click_points = param['points']
     clone = param['image']
     window_name = param['window_name']
     max_points = param.get('max_points', 2)  # Default to 2 for rectangle selection
@@ -32,20 +26,20 @@ def get_user_clicks(screenshot, prompt_text, num_points=1):
     Interactively asks the user to click on specific points on the screen.
     Returns a list of (x, y) tuples.
     """
-    global click_points
     window_name = "Setup: Define Points"
     
-    click_points = []  # Reset points
+    click_points = []  # Filled in by mouse_callback
     clone = screenshot.copy()
     cv2.namedWindow(window_name)
-    cv2.setMouseCallback(window_name, mouse_callback, {'image': clone, 'window_name': window_name, 'max_points': num_points})
+    cv2.setMouseCallback(window_name, mouse_callback, {'image': clone, 'window_name': window_name, 'max_points': num_points, 'points': click_points})
     
     cv2.putText(clone, prompt_text, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
     cv2.putText(clone, prompt_text, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
     
+    # The image only changes on a click, and mouse_callback redraws it then
+    cv2.imshow(window_name, clone)
     while len(click_points) < num_points:
-        cv2.imshow(window_name, clone)
-        if cv2.waitKey(1) & 0xFF == 27: # Allow escape to exit
+        if cv2.waitKey(30) & 0xFF == 27: # Allow escape to exit
             cv2.destroyAllWindows()
             return None
             
@@ -58,21 +52,21 @@ def get_panel_from_user(screenshot, name="Ingredient"):
     """
     Interactively asks the user to define the a panel by clicking.
     """
-    global click_points
     window_name = f"Setup: Define {name} Panel"
     
     while True:  # Main loop for retries
-        click_points = []  # Reset points for each attempt
+        click_points = []  # Reset points for each attempt, filled in by mouse_callback
         clone = screenshot.copy()
         cv2.namedWindow(window_name)
-        cv2.setMouseCallback(window_name, mouse_callback, {'image': clone, 'window_name': window_name})
+        cv2.setMouseCallback(window_name, mouse_callback, {'image': clone, 'window_name': window_name, 'points': click_points})
         
         cv2.putText(clone, f"Click TOP-LEFT, then BOTTOM-RIGHT of the {name} panel.", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
         cv2.putText(clone, f"Click TOP-LEFT, then BOTTOM-RIGHT of the {name} panel.", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
         
+        # The image only changes on a click, and mouse_callback redraws it then
+        cv2.imshow(window_name, clone)
         while len(click_points) < 2:
-            cv2.imshow(window_name, clone)
-            if cv2.waitKey(1) & 0xFF == 27:  # Allow escape to exit
+            if cv2.waitKey(30) & 0xFF == 27:  # Allow escape to exit
                 cv2.destroyAllWindows()
                 return None
 
@@ -101,31 +95,39 @@ def get_panel_from_user(screenshot, name="Ingredient"):
 def step_1_find_main_panels(config_manager):
     """STEP 1: Captures the full screen and finds the main UI panels using user input."""
     print("\n--- Step 1: Main Panel Calibration ---")
-    screen_width, screen_height = pyautogui.size()
+    # The primary monitor matches the game's fullscreen display
+    monitor_region = primary_monitor()
+    screen_width, screen_height = monitor_region['width'], monitor_region['height']
     print("🔍 Searching for main game panels...")
-    with mss() as sct:
-        monitor = {"top": 0, "left": 0, "width": screen_width, "height": screen_height}
-        screenshot = np.array(sct.grab(monitor))
-        screenshot_bgr = cv2.cvtColor(screenshot, cv2.COLOR_BGRA2BGR)
-        gray = cv2.cvtColor(screenshot_bgr, cv2.COLOR_BGR2GRAY)
+    monitor = {"top": 0, "left": 0, "width": screen_width, "height": screen_height}
+    screenshot = grab_image(monitor)
 
     ingredient_panel_roi = get_panel_from_user(screenshot, "Ingredient")
     recipe_list_roi = get_panel_from_user(screenshot, "Recipe")
 
     # Display what was found for user confirmation
-    debug_img = screenshot_bgr.copy()
-    r1 = ingredient_panel_roi
-    cv2.rectangle(debug_img, (r1['left'], r1['top']), (r1['left'] + r1['width'], r1['top'] + r1['height']), (0, 255, 0), 3)
-    r2 = recipe_list_roi
-    cv2.rectangle(debug_img, (r2['left'], r2['top']), (r2['left'] + r2['width'], r2['top'] + r2['height']), (0, 0, 255), 3)
+    # The preview is only for a quick visual check, so draw it at half size.
+    # resize returns a new image, so no copy is needed before drawing on it
+    preview_scale = 0.5
+    debug_img = cv2.resize(screenshot, None, fx=preview_scale, fy=preview_scale, interpolation=cv2.INTER_AREA)
+    debug_img = cv2.cvtColor(debug_img, cv2.COLOR_BGRA2BGR)
+
+    def scaled_corners(roi):
+        top_left = (int(roi['left'] * preview_scale), int(roi['top'] * preview_scale))
+        bottom_right = (int((roi['left'] + roi['width']) * preview_scale), int((roi['top'] + roi['height']) * preview_scale))
+        return top_left, bottom_right
+
+    cv2.rectangle(debug_img, *scaled_corners(ingredient_panel_roi), (0, 255, 0), 2)
+    cv2.rectangle(debug_img, *scaled_corners(recipe_list_roi), (0, 0, 255), 2)
 
     cv2.putText(debug_img, "Found Panels. Press any key to continue.", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
     cv2.imshow("Setup: Panel Detection", debug_img)
     cv2.waitKey(0)
     cv2.destroyAllWindows()
 
-    config_manager.update_setting("ocr_regions.ingredient_panel_roi", ingredient_panel_roi)
-    config_manager.update_setting("ocr_regions.recipe_list_roi", recipe_list_roi)
+    with config_manager:
+        config_manager.update_setting("ocr_regions.ingredient_panel_roi", ingredient_panel_roi)
+        config_manager.update_setting("ocr_regions.recipe_list_roi", recipe_list_roi)
     return screenshot
 
 
@@ -150,36 +152,34 @@ def step_2_calibrate_recipe_layout(config_manager, screenshot):
     input("Press Enter when ready to find recipe slots...")
 
     recipe_roi = config_manager.get_setting("ocr_regions.recipe_list_roi")
-    with mss() as sct:
-        # Grab a fresh screenshot of the recipe panel
-        recipe_panel_img = np.array(sct.grab(recipe_roi))
+    # Grab a fresh screenshot of the recipe panel
+    recipe_panel_img = grab_image(recipe_roi)
 
-    # Convert from 4-channel BGRA to 3-channel BGR for color matching
+    # COLOR_BGR2HSV accepts the 4-channel BGRA grab directly and ignores the alpha channel,
+    # so no separate BGRA->BGR copy is needed
     recipe_panel_img_hsv = cv2.cvtColor(recipe_panel_img, cv2.COLOR_BGR2HSV)
 
 
     # recipe boxes are coloured boxes on greyscale background
     minimum_saturation_ratio = 0.2
     recipe_panel_height, recipe_panel_width, _ = recipe_panel_img_hsv.shape
-    mask = np.zeros((recipe_panel_height, recipe_panel_width), dtype=np.uint8)
 
-    lower_bound = np.array([0.0, minimum_saturation_ratio*255, 0.0])
-    upper_bound = np.array([255.0, 255.0, 255.0])
-    mask = cv2.inRange(recipe_panel_img_hsv, lower_bound, upper_bound)
+    # Only saturation matters, so threshold that channel alone (keeps pixels with S >= 0.2*255)
+    saturation_threshold = int(np.ceil(minimum_saturation_ratio * 255)) - 1
+    _, mask = cv2.threshold(recipe_panel_img_hsv[:, :, 1], saturation_threshold, 255, cv2.THRESH_BINARY)
 
 
-    # Find contours on the mask and filter them
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    recipe_slots_relative = []
+    # Find connected regions on the mask and filter them
+    # stats rows are [left, top, width, height, area]; row 0 is the background
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
     min_area = 500  # Heuristic to filter out small noise
-    for contour in contours:
-        if cv2.contourArea(contour) > min_area:
-            recipe_slots_relative.append(cv2.boundingRect(contour))
+    component_stats = stats[1:]
+    keep = component_stats[:, cv2.CC_STAT_AREA] > min_area
+    slot_rects = component_stats[keep, :4]
 
-    recipe_slots_relative = list(set(recipe_slots_relative))
-    
-        # Sort boxes in reading order
-    recipe_slots_relative.sort(key=lambda r: (r[1], r[0])) 
+    # Sort boxes in reading order (by top, then left)
+    slot_rects = slot_rects[np.lexsort((slot_rects[:, 0], slot_rects[:, 1]))]
+    recipe_slots_relative = [tuple(int(v) for v in rect) for rect in slot_rects]
 
 
     if len(recipe_slots_relative) < 6:
@@ -224,10 +224,11 @@ def step_2_calibrate_recipe_layout(config_manager, screenshot):
     print(f"✅ Calculated vertical coordinates: {vertical_coords}")
     # --- Save to config ---
     print("\n Saving new recipe layout configuration...")
-    config_manager.update_setting("recipe_layout.page_indicators", page_indicators)
-    config_manager.update_setting("recipe_layout.recipe_slot_rois", recipe_slot_rois)
-    config_manager.update_setting("recipe_layout.recipe_indicator_rois", recipe_indicator_rois)
-    config_manager.update_setting("recipe_layout.vertical_coords", vertical_coords)
+    with config_manager:
+        config_manager.update_setting("recipe_layout.page_indicators", page_indicators)
+        config_manager.update_setting("recipe_layout.recipe_slot_rois", recipe_slot_rois)
+        config_manager.update_setting("recipe_layout.recipe_indicator_rois", recipe_indicator_rois)
+        config_manager.update_setting("recipe_layout.vertical_coords", vertical_coords)
     
     return True
 
@@ -240,11 +241,10 @@ def find_ingredient_slots(panel_roi):
     # initial setup screen should be valid for this function, so no input() is needed
 
 
-    with mss() as sct:
-        panel_screenshot = np.array(sct.grab(panel_roi))
+    panel_screenshot = grab_image(panel_roi)
 
-    gray = cv2.cvtColor(panel_screenshot, cv2.COLOR_BGRA2GRAY)
-    _, thresh = cv2.threshold(gray, 250, 255, cv2.THRESH_BINARY)
+    # Labels are near-white: keep pixels whose B, G and R are all above 250, in one pass over the BGRA grab
+    thresh = cv2.inRange(panel_screenshot, (251, 251, 251, 0), (255, 255, 255, 255))
 
 
     # Debug - show thresholded image for verification
@@ -252,33 +252,33 @@ def find_ingredient_slots(panel_roi):
     # cv2.waitKey(0)
     # cv2.destroyAllWindows()
 
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # stats rows are [left, top, width, height, area]; row 0 is the background
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+    component_stats = stats[1:]
+    widths = component_stats[:, cv2.CC_STAT_WIDTH]
+    heights = component_stats[:, cv2.CC_STAT_HEIGHT]
+    areas = widths * heights
+    # Use similar heuristics as the original bot to find the boxes
+    keep = (1000 < areas) & (areas < 50000) & (widths > 2.0 * heights)
+
+    # Sort boxes in column reading order (left side top to bottom then right side top to bottom)
+    slot_labels = np.flatnonzero(keep) + 1
+    slot_labels = slot_labels[np.lexsort((stats[slot_labels, cv2.CC_STAT_TOP], stats[slot_labels, cv2.CC_STAT_LEFT]))]
+    slot_rects = stats[slot_labels, :4]
 
     width = 0
     height = 0
+    first_slot_pixels = None
 
-    boxes = []
-    first_contour = None
+    if len(slot_rects):
+        x, y, width, height = (int(v) for v in slot_rects[0])
+        assert (np.abs(slot_rects[:, 2] - width) < 2).all(), "Inconsistent box widths, This shouldn't happen - please talk to dev"
+        assert (np.abs(slot_rects[:, 3] - height) < 2).all(), "Inconsistent box heights, Please select a different food as the ingredient pictures are too bright"
 
-    for contour in contours:
-        rect = cv2.boundingRect(contour)
-        x, y, w, h = rect
-        area = w * h
-        aspect_ratio = w / float(h) if h > 0 else 0
-        # Use similar heuristics as the original bot to find the boxes
-        if 1000 < area < 50000 and aspect_ratio > 2.0:
-            boxes.append(rect)
-
-            if width == 0:
-                width = w
-                height = h
-                first_contour = contour
-            else:
-                assert abs(width - w) < 2, "Inconsistent box widths, This shouldn't happen - please talk to dev"
-                assert abs(height - h) < 2, "Inconsistent box heights, Please select a different food as the ingredient pictures are too bright"
+        # Pixels of the first slot, relative to its own bounding box, for the corner mask
+        first_slot_pixels = labels[y:y+height, x:x+width] == slot_labels[0]
 
-    # Sort boxes in column reading order (left side top to bottom then right side top to bottom)
-    boxes.sort(key=lambda b: (b[0], b[1]))
+    boxes = [tuple(int(v) for v in rect) for rect in slot_rects]
 
     if len(boxes) < 5:
         print(f"❌ ERROR: Expected to find 5 or more ingredient slots, but only found {len(boxes)} slots.")
@@ -288,7 +288,7 @@ def find_ingredient_slots(panel_roi):
     print(f"✅ Successfully found {len(boxes)} ingredient slots.")
 
     if len(boxes) == 8:
-        return boxes, first_contour
+        return boxes, first_slot_pixels
     
     y_values = [box[1] for box in boxes]
     x_value_right_column = boxes[-1][0]
@@ -299,30 +299,26 @@ def find_ingredient_slots(panel_roi):
         # new_box = {"top": y_values[new_box_y_ind], "left" : x_value_right_column, "width" : width, "height" : height}
         boxes.append(new_box)
 
-    return boxes, first_contour
+    return boxes, first_slot_pixels
         
 
 
-def create_corner_mask(first_slot_contour, mask_path):
+def create_corner_mask(first_slot_pixels, mask_path):
     """
     Creates and saves a mask image to handle the rounded corners of ingredient slots.
+    first_slot_pixels is a boolean image of one slot's pixels, cropped to its bounding box.
     """
-     # Calculate the bounding rectangle directly from the contour
-    x, y, w, h = cv2.boundingRect(first_slot_contour)
-
+    h, w = first_slot_pixels.shape
 
     # Create a blank image for the mask
     mask = np.zeros((h, w), dtype=np.uint8)
 
-    # The contour is relative to the panel, but we need it relative to its own bounding box.
-    # We need to shift the contour to be relative to the rect's origin (0,0).
-    shifted_contour = first_slot_contour - (x, y)
-
-    # Use convex hull to create a solid shape
-    hull = cv2.convexHull(shifted_contour)
+    # Use the convex hull of the slot's pixels to create a solid shape
+    ys, xs = np.nonzero(first_slot_pixels)
+    hull = cv2.convexHull(np.column_stack((xs, ys)).astype(np.int32))
 
-    # Draw the filled hull onto the mask
-    cv2.drawContours(mask, [hull], -1, 255, -1)
+    # Fill the hull onto the mask. It's convex by construction, so the specialised fill applies
+    cv2.fillConvexPoly(mask, hull, 255)
 
     # Ensure the directory exists
     mask_path.parent.mkdir(parents=True, exist_ok=True)
@@ -339,7 +335,7 @@ def step_3_process_ingredient_slots(config_manager):
         print("Ingredient panel failed to save to config. Exiting")
         return False
 
-    slots, first_slot_contour = find_ingredient_slots(ingredient_panel_roi)
+    slots, first_slot_pixels = find_ingredient_slots(ingredient_panel_roi)
     if not slots:
         return False
 
@@ -351,11 +347,12 @@ def step_3_process_ingredient_slots(config_manager):
         ingredient_slot_rois.append(relative_roi)
 
     mask_path = Path("assets/masks/ingredient_mask.png")
-    create_corner_mask(first_slot_contour, mask_path)
+    create_corner_mask(first_slot_pixels, mask_path)
 
     print("\n💾 Saving configuration...")
-    config_manager.update_setting("ocr_regions.ingredient_slot_rois", ingredient_slot_rois)
-    config_manager.update_setting("bot_settings.ingredient_mask_path", str(mask_path))
+    with config_manager:
+        config_manager.update_setting("ocr_regions.ingredient_slot_rois", ingredient_slot_rois)
+        config_manager.update_setting("bot_settings.ingredient_mask_path", str(mask_path))
     return True    
 
 
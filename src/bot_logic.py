@@ -1,5 +1,7 @@
 from typing import List, Tuple
 import difflib
+import functools
+import operator
 import re
 import logging
 
@@ -12,6 +14,43 @@ NUMBER_WORDS = {
     'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
 }
 
+# Every way a step that ends in a number word can end, for a cheap first check
+NUMBER_WORD_ENDINGS = tuple(ending for word in (*NUMBER_WORDS, 'times') for ending in (word, word + '.'))
+
+# Compiled once at import, rather than looked up (or rebuilt) on every step
+NUMERIC_COUNT_RE = re.compile(r'[\(\{}](\d+)[\)\}]')
+NUMERIC_COUNT_SUB_RE = re.compile(r'\s*\(\d+\)', flags=re.IGNORECASE)
+WORD_SPLIT_RE = re.compile(r"[\.\s]+")
+EXTRA_FIELD_SPLIT_RE = re.compile(r'[\.,] | and ')
+
+
+def _find_trailing_number_word(step_lower: str) -> Tuple[int, str] | None:
+    """
+    Finds a number word at the very end of a lower-cased step, optionally followed by
+    "times" and/or a full stop (e.g. "roll twice", "cut eight times.").
+    Returns (start index, number word), or None if the step doesn't end in one.
+    """
+    # Most steps don't end in a count at all, so reject those with a single C-level check
+    if not step_lower.endswith(NUMBER_WORD_ENDINGS):
+        return None
+
+    word_end = len(step_lower) - 1 if step_lower.endswith('.') else len(step_lower)
+    if step_lower.endswith('times', 0, word_end):
+        before_times = step_lower[:word_end - 5].rstrip()
+        # "times" must be separated from the number word by whitespace
+        if len(before_times) < word_end - 5:
+            word_end = len(before_times)
+
+    # Walk back over the last word. Number words are short, so this is only a few characters.
+    word_start = word_end
+    while word_start > 0 and (step_lower[word_start - 1].isalnum() or step_lower[word_start - 1] == '_'):
+        word_start -= 1
+
+    word = step_lower[word_start:word_end]
+    if word in NUMBER_WORDS:
+        return word_start, word
+    return None
+
 
 def _parse_step_for_action_and_count(step: str) -> Tuple[str, int]:
     """
@@ -19,21 +58,18 @@ def _parse_step_for_action_and_count(step: str) -> Tuple[str, int]:
     Handles formats like "Nuggets (4)" and "Roll twice".
     """
     # Case 1: "Nuggets (4)" - handles one or more digits
-    numeric_match = re.search(r'[\(\{}](\d+)[\)\}]', step)
+    numeric_match = NUMERIC_COUNT_RE.search(step)
     if numeric_match:
         count = int(numeric_match.group(1))
-        action = re.sub(r'\s*\(\d+\)', '', step, flags=re.IGNORECASE).strip()
+        action = NUMERIC_COUNT_SUB_RE.sub('', step).strip()
         return action, count
 
     # Case 2: "Cut eight times" or "Roll twice"
-    step_lower = step.lower()
-    # Anchors the match to the end of the string for reliability
-    number_word_pattern = r'\b(' + '|'.join(NUMBER_WORDS.keys()) + r')\b(?:\s+times)?\.?$'
-    text_match = re.search(number_word_pattern, step_lower)
-    if text_match:
-        number_word = text_match.group(1)
+    number_word_match = _find_trailing_number_word(step.lower())
+    if number_word_match:
+        word_start, number_word = number_word_match
         count = NUMBER_WORDS[number_word]
-        action = step[:text_match.start()].strip()
+        action = step[:word_start].strip()
         if action:
             return action, count
 
@@ -41,7 +77,38 @@ def _parse_step_for_action_and_count(step: str) -> Tuple[str, int]:
     return step, 1
 
 
-def _find_best_match(target: str, options: List[str]) -> dict | None:
+def _first_letters(text_lower: str, empty_word_marker) -> List:
+    """
+    Returns the first letter of each word in text_lower, with empty_word_marker in place of
+    empty words (e.g. from a leading '.'). Options and targets use different markers so that
+    two empty words never count as a first-letter match.
+    """
+    return [word[0] if word else empty_word_marker for word in WORD_SPLIT_RE.split(text_lower)]
+
+
+def _prepare_options(options: List[str]) -> List[Tuple[int, str, str, List[str]]]:
+    """
+    Lower-cases the match options and finds their word first letters once, so they can be reused for every step on a page.
+    Returns (index, original, lowered, first letters) tuples, skipping empty options.
+    """
+    prepared = []
+    for i, opt in enumerate(options):
+        if not opt:
+            continue
+        opt_lower = opt.lower()
+        prepared.append((i, opt, opt_lower, _first_letters(opt_lower, '')))
+    return prepared
+
+
+def _add_first_letter_bonus(ratio: float, matching_first_letters: int, bonus: float) -> float:
+    """Adds the first-letter bonus once per matching word, in the same order _find_best_match always has."""
+    score = ratio
+    for _ in range(matching_first_letters):
+        score += bonus
+    return score
+
+
+def _find_best_match(target: str, options: List[str], prepared_options: List[Tuple[int, str, str, List[str]]] | None = None, min_score: float = 0.0) -> dict | None:
     """
     Finds the best match for a target string from a list of options using a multi-criteria scoring model.
 
@@ -52,10 +119,12 @@ def _find_best_match(target: str, options: List[str]) -> dict | None:
     Args:
         target: The string to find a match for (e.g., a recipe step).
         options: A list of available strings to match against (e.g., ingredients on page).
+        prepared_options: Optional output of _prepare_options(options), to avoid redoing it per target.
+        min_score: Options whose score cannot reach this are never fully scored.
 
     Returns:
         A dictionary containing the best match details (including the new 'score'),
-        or None if no suitable match is found.
+        or None if no suitable match is found. A match below min_score may still be returned.
     """
     if not target or not options:
         return None
@@ -69,44 +138,73 @@ def _find_best_match(target: str, options: List[str]) -> dict | None:
     # SequenceMatcher is efficient for repeated comparisons against a single string.
     matcher = difflib.SequenceMatcher(isjunk=None, b=target_lower)
 
+    if prepared_options is None:
+        prepared_options = _prepare_options(options)
+
     best_match_details = None
     highest_score = -1.0
-    split_pattern = "[\.\s]+"
+    # The target is the same for every option, so split it once up front.
+    target_first_letters = _first_letters(target_lower, None)
 
-    for i, opt in enumerate(options):
-        if not opt:
-            continue
+    # First pass: a cheap upper bound on every option's score, using quick_ratio.
+    candidates = []
+    for i, opt, opt_lower, opt_first_letters in prepared_options:
+        # Add a bonus for each word whose first letter matches. This helps prioritize
+        # abbreviations or partial OCR reads (e.g., "L" for "Lettuce").
+        matching_first_letters = sum(map(operator.eq, opt_first_letters, target_first_letters))
 
-        opt_lower = opt.lower()
         matcher.set_seq1(opt_lower)
-        score = ratio = matcher.ratio()
-
-        # Add a bonus if the first letters match. This helps prioritize
-        # abbreviations or partial OCR reads (e.g., "L" for "Lettuce").
-        opt_words = re.split(split_pattern, opt_lower)
-        target_words = re.split(split_pattern, target_lower)
+        upper_bound = _add_first_letter_bonus(matcher.quick_ratio(), matching_first_letters, FIRST_LETTER_BONUS)
+        candidates.append((upper_bound, i, opt, opt_lower, matching_first_letters))
+
+    # Second pass: compute the full (expensive) ratio, most promising options first, and stop
+    # as soon as no remaining option can beat the best score. Ties go to the earliest option.
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+    for upper_bound, i, opt, opt_lower, matching_first_letters in candidates:
+        if upper_bound < highest_score or upper_bound < min_score:
+            break
+        if upper_bound == highest_score and i > best_match_details['index']:
+            continue
 
-        for opt_word, target_word in zip(opt_words, target_words):
-            if opt_word and target_word and opt_word[0] == target_word[0]:
-                score += FIRST_LETTER_BONUS
+        matcher.set_seq1(opt_lower)
+        ratio = matcher.ratio()
+        score = _add_first_letter_bonus(ratio, matching_first_letters, FIRST_LETTER_BONUS)
 
-        if score > highest_score:
+        if score > highest_score or (score == highest_score and i < best_match_details['index']):
             highest_score = score
             best_match_details = {'text': opt, 'index': i, 'ratio': ratio, 'score': score}
 
     return best_match_details
 
+@functools.lru_cache(maxsize=256)
+def _prepare_options_cached(options: Tuple[str, ...]) -> List[Tuple[int, str, str, List[str]]]:
+    """_prepare_options for a hashable options tuple, cached since the same page is often seen again."""
+    return _prepare_options(list(options))
+
+
+@functools.lru_cache(maxsize=4096)
+def _find_best_match_cached(target: str, options: Tuple[str, ...], min_score: float = 0.0) -> dict | None:
+    """
+    Memoized _find_best_match. The ingredient vocabulary is small, so the same
+    (step, page) pairs recur across recipes. The returned dict is shared and must not be modified.
+    """
+    return _find_best_match(target, list(options), _prepare_options_cached(options), min_score)
+
+
 def split_extra_field(extra_field: List[str]):
     if not extra_field:
         return []
     
     expanded_steps = []
     # Keep parentheses for number parsing, split on other non-alphanumeric chars
-    pattern_to_split = r'[\.,] | and '
-
     for text_section in extra_field:
-        if re.search(pattern_to_split, text_section):
-            sub_steps = [s.strip() for s in re.split(pattern_to_split, text_section)]
+        # Cheap substring gate for the separators EXTRA_FIELD_SPLIT_RE can match
+        if '. ' not in text_section and ', ' not in text_section and ' and ' not in text_section:
+            expanded_steps.append(text_section)
+            continue
+        parts = EXTRA_FIELD_SPLIT_RE.split(text_section)
+        if len(parts) > 1:
+            sub_steps = [s.strip() for s in parts]
             expanded_steps.extend([step for step in sub_steps if step])
         else:
             expanded_steps.append(text_section)
@@ -115,17 +213,50 @@ def split_extra_field(extra_field: List[str]):
 
 
 
+def map_ingredients_to_keys(
+    required_steps: List[str],
+    available_on_page: List[str],
+    input_keys: List[str]
+) -> Tuple[List[str], List[str]]:
+    """
+    Maps recipe steps for a single page to keyboard inputs using exact name matches.
+
+    Args:
+        required_steps: The list of required recipe steps for the current page.
+        available_on_page: The list of ingredients visible on screen.
+        input_keys: The list of keys corresponding to ingredient positions.
+
+    Returns:
+        A tuple of (keys to press, steps that were matched), both in recipe order.
+    """
+    # First position of each name, matching list.index(), built once per page.
+    positions = {}
+    for i, name in enumerate(available_on_page):
+        positions.setdefault(name, i)
+
+    keys = []
+    matched = []
+    for step in required_steps:
+        index = positions.get(step)
+        if index is not None and index < len(input_keys):
+            keys.append(input_keys[index])
+            matched.append(step)
+
+    log.debug("Exact mapped keys for page: %s", keys)
+    return keys, matched
+
+
 def fuzzy_map_ingredients_to_keys(
     required_steps: List[str],
     available_on_page: List[str],
     input_keys: List[str],
     config: dict
-) -> List[str]:
+) -> List[Tuple[str, int]]:
     """
     Maps recipe steps for a single page to keyboard inputs using fuzzy string matching.
 
     This function handles simple ingredient names as well as long, multi-step 
-    instructions by breaking them down. It returns a list of keys to press
+    instructions by breaking them down. It returns (key, count) runs to press
     in the correct order for the current page.
 
     Args:
@@ -135,15 +266,23 @@ def fuzzy_map_ingredients_to_keys(
         config: A dictionary of fuzzy matching settings.
 
     Returns:
-        A list of keys to press.
+        A list of (key, count) tuples to press.
     """
     match_threshold = config.get('fuzzy_match_threshold', 0.6)
 
+    # Nothing on screen can match, so skip parsing and matching every step.
+    if not available_on_page:
+        log.debug("No Matches found on this page")
+        return []
+
+    # 1. Make the on-screen options hashable so match results can be memoized.
+    options = tuple(available_on_page)
+
     # 2. Parse each step for its action and count, then find the best match.
     all_matches = []
     for step_text in required_steps:
         action, count = _parse_step_for_action_and_count(step_text)
-        best_match = _find_best_match(action, available_on_page)
+        best_match = _find_best_match_cached(action, options, match_threshold)
         if best_match and best_match['score'] >= match_threshold:
             all_matches.append({
                 'count': count,
@@ -159,12 +298,10 @@ def fuzzy_map_ingredients_to_keys(
         log.debug("No Matches found on this page")
         return []
     
-    log.debug(f"Matches Found: {all_matches}")
+    log.debug("Matches Found: %s", all_matches)
 
-    # 3. Convert matches to key presses.
-    final_keys = []
-    for match in all_matches:
-        final_keys.extend([input_keys[match['index']]] * match['count'])
+    # 3. Convert matches to (key, count) runs; the counts are expanded when pressing.
+    final_keys = [(input_keys[match['index']], match['count']) for match in all_matches]
 
-    log.debug(f"Fuzzy mapped keys for page: {final_keys}")
+    log.debug("Fuzzy mapped keys for page: %s", final_keys)
     return final_keys
@@ -11,8 +11,25 @@ class ConfigManager:
     def __init__(self, config_path: str = 'config.json'):
         self.config_path = Path(config_path)
         self.config = {}
+        self._flat = {}
+        self._batch_depth = 0
+        self._save_pending = False
         self._load_or_create_config()
 
+    def __enter__(self):
+        """
+        Defers saving until the outermost `with` block exits, so a group of
+        update_setting calls rewrites the file once.
+        """
+        self._batch_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._save_pending:
+            self.save_config()
+        return False
+
     def _get_default_config(self) -> dict:
         """Returns the default configuration structure."""
         return {
@@ -72,17 +89,20 @@ class ConfigManager:
 
     def _merge_dicts(self, base_dict: dict, override_dict: dict) -> dict:
         """
-        Recursively merges the override_dict into the base_dict.
+        Merges the override_dict into the base_dict in place and returns it.
         Values from override_dict take precedence. This ensures user settings
         are preserved while new default settings can be added.
+        The base_dict is modified, so pass a fresh copy (e.g. from _get_default_config).
         """
-        merged = base_dict.copy()
-        for key, value in override_dict.items():
-            if isinstance(value, dict) and key in merged and isinstance(merged[key], dict):
-                merged[key] = self._merge_dicts(merged[key], value)
-            else:
-                merged[key] = value
-        return merged
+        stack = [(base_dict, override_dict)]
+        while stack:
+            base_level, override_level = stack.pop()
+            for key, value in override_level.items():
+                if isinstance(value, dict) and isinstance(base_level.get(key), dict):
+                    stack.append((base_level[key], value))
+                else:
+                    base_level[key] = value
+        return base_dict
 
     def _load_or_create_config(self):
         """
@@ -100,8 +120,28 @@ class ConfigManager:
                 self.config = default_config
         else:
             self.config = default_config
+        self._rebuild_flat_index()
         self.save_config()
 
+    def _rebuild_flat_index(self):
+        """
+        Rebuilds the dot-path -> (containing dict, key) index used by get_setting.
+        Nested dicts are indexed too. Values are read from their live containing dict on every
+        lookup, so edits to existing keys in self.config (or in a dict returned by get_setting)
+        are seen straight away. Adding keys or replacing whole sections must go through
+        update_setting, which rebuilds the index.
+        """
+        flat = {}
+        stack = [('', self.config)]
+        while stack:
+            prefix, level = stack.pop()
+            for key, value in level.items():
+                path = f"{prefix}{key}"
+                flat[path] = (level, key)
+                if isinstance(value, dict):
+                    stack.append((path + '.', value))
+        self._flat = flat
+
     def get_setting(self, path: str, default=None):
         """
         Retrieves a nested setting from the configuration using a dot-separated path.
@@ -114,13 +154,11 @@ class ConfigManager:
         Returns:
             The value of the setting, or the default value if not found.
         """
-        keys = path.split('.')
-        value = self.config
-        for key in keys:
-            value = value.get(key)
-            if value is None:
-                log.warning(f"Setting '{path}' not found in configuration. Using default value: {default}")
-                return default
+        entry = self._flat.get(path)
+        value = entry[0].get(entry[1]) if entry is not None else None
+        if value is None:
+            log.warning(f"Setting '{path}' not found in configuration. Using default value: {default}")
+            return default
         return value
 
     def update_setting(self, path: str, value):
@@ -146,9 +184,14 @@ class ConfigManager:
                 return
 
         current_level[keys[-1]] = value
+        self._rebuild_flat_index()
         self.save_config()
 
     def save_config(self):
-        """Saves the current configuration to the file."""
-        with open(self.config_path, 'w') as f:
-            json.dump(self.config, f, indent=4)
\ No newline at end of file
+        """Saves the current configuration to the file, or defers it while batching."""
+        if self._batch_depth:
+            self._save_pending = True
+            return
+        self._save_pending = False
+        # Serialise in one go and write once rather than streaming many small chunks.
+        self.config_path.write_text(json.dumps(self.config, indent=4))
\ No newline at end of file
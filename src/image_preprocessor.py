@@ -1,4 +1,5 @@
 import cv2
+import functools
 import numpy as np
 import logging
 
@@ -7,60 +8,144 @@ log = logging.getLogger('csd2_bot')
 class ImagePreprocessor:
     """A collection of static methods for common image pre-processing tasks for OCR."""
 
+    # Shears smaller than this move glyphs by well under a pixel at label heights, so they're skipped.
+    MIN_SHEAR_FACTOR = 0.02
+
+    # cvtColor code that turns an image with this many channels into grayscale
+    GRAY_CONVERSIONS = {4: cv2.COLOR_BGRA2GRAY, 3: cv2.COLOR_BGR2GRAY}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _normalize_transform(h: int, w: int, target_h: int, padding: int, shear_factor: float = 0.0) -> tuple[np.ndarray, tuple[int, int]]:
+        """
+        Builds the 2x3 affine matrix and output size that scale an h x w image to target_h high,
+        pad it on every side and optionally shear it (x' = x + shear * y), for a single warpAffine.
+        Cached, since every slot of a layout has the same size; the matrix is read-only.
+        """
+        if target_h < h:
+            log.warning("Attempting to downsize image?")
+        target_w = int(w * target_h / h)
+        scale_x, scale_y = target_w / w, target_h / h
+
+        # Resize (with cv2.resize's pixel-centre alignment) and pad, then shear.
+        scale_and_pad = np.array([[scale_x, 0, padding + 0.5 * (scale_x - 1)],
+                                  [0, scale_y, padding + 0.5 * (scale_y - 1)],
+                                  [0, 0, 1]])
+        if abs(shear_factor) >= ImagePreprocessor.MIN_SHEAR_FACTOR:
+            shear = np.array([[1, shear_factor, 0], [0, 1, 0], [0, 0, 1]])
+            scale_and_pad = shear @ scale_and_pad
+
+        M = np.ascontiguousarray(scale_and_pad[:2])
+        M.setflags(write=False)
+        return M, (target_w + 2 * padding, target_h + 2 * padding)
+
     @staticmethod
     def normalize(image: np.ndarray) -> np.ndarray:
         """
         Normalizes an image for OCR by resizing to a standard height and adding padding.
+        Upscaling resizes and pads in one warpAffine pass.
         """
         target_h = 60
+        padding = 10
         h, w = image.shape[:2]
         if target_h < h:
+            # Area averaging is the cheap, alias-free choice for shrinking, but warpAffine doesn't offer it.
             log.warning("Attempting to downsize image?")
-        scale_ratio = target_h / h
-        target_w = int(w * scale_ratio)
-        resized_image = cv2.resize(image, (target_w, target_h), interpolation=cv2.INTER_CUBIC)
+            # Resize straight into the interior of the white, padded output rather than padding a copy.
+            target_w = int(w * target_h / h)
+            padded_image = np.full((target_h + 2 * padding, target_w + 2 * padding) + image.shape[2:], 255, dtype=image.dtype)
+            cv2.resize(image, (target_w, target_h), dst=padded_image[padding:padding + target_h, padding:padding + target_w],
+                       interpolation=cv2.INTER_AREA)
+            return padded_image
+
+        M, out_size = ImagePreprocessor._normalize_transform(h, w, target_h, padding)
+        padded_image = cv2.warpAffine(image, M, out_size, flags=cv2.INTER_CUBIC,
+                                      borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255, 255))
 
-        padding = 10
-        num_channels = resized_image.shape[2] if len(resized_image.shape) > 2 else 1
-        border_color = [255] * num_channels if num_channels > 1 else 255
-        padded_image = cv2.copyMakeBorder(resized_image, padding, padding, padding, padding, cv2.BORDER_CONSTANT, value=border_color)
-        
         log.debug("Image normalized with resizing and padding.")
         return padded_image
 
     @staticmethod
-    def binarize(image: np.ndarray, invert_colors: bool = False) -> np.ndarray | None:
+    def binarize(image: np.ndarray, invert_colors: bool = False, threshold: float | None = None) -> np.ndarray | None:
         """
-        Converts an image to a binary (black and white) format using Otsu's thresholding.
+        Converts an image to a binary (black and white) format using Otsu's thresholding,
+        or a fixed threshold (e.g. one Otsu value shared by several crops of the same panel).
         """
         if image is None:
             log.error("Cannot binarize a None image.")
             return None
 
-        if len(image.shape) == 3 and image.shape[2] == 4:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
-        elif len(image.shape) == 3 and image.shape[2] == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        elif len(image.shape) == 2:
+        if image.ndim == 2:
             gray = image
         else:
-            log.error(f"Unsupported image shape for binarization: {image.shape}")
-            return None
+            conversion = ImagePreprocessor.GRAY_CONVERSIONS.get(image.shape[2]) if image.ndim == 3 else None
+            if conversion is None:
+                log.error(f"Unsupported image shape for binarization: {image.shape}")
+                return None
+            gray = cv2.cvtColor(image, conversion)
 
         threshold_type = cv2.THRESH_BINARY_INV if invert_colors else cv2.THRESH_BINARY
+        if threshold is not None:
+            _, processed_image = cv2.threshold(gray, threshold, 255, threshold_type)
+            log.debug("Image binarized at %s. Inverted colors: %s", threshold, invert_colors)
+            return processed_image
+
+        # Already black and white (e.g. a colour mask): Otsu would reproduce it, so skip the histogram.
+        if gray.dtype == np.uint8 and cv2.countNonZero(cv2.inRange(gray, 1, 254)) == 0:
+            log.debug("Image already binary. Inverted colors: %s", invert_colors)
+            return cv2.bitwise_not(gray) if invert_colors else gray
+
         _, processed_image = cv2.threshold(gray, 0, 255, threshold_type + cv2.THRESH_OTSU)
-        log.debug(f"Image binarized for OCR. Inverted colors: {invert_colors}")
+        log.debug("Image binarized for OCR. Inverted colors: %s", invert_colors)
         return processed_image
 
     @staticmethod
-    def correct_shear(image: np.ndarray, shear_factor: float) -> np.ndarray:
-        """Corrects for horizontal shear in an image (e.g., italics)."""
-        if shear_factor == 0.0:
-            return image
-        (h, w) = image.shape[:2]
-        M = np.array([[1, shear_factor, 0], [0, 1, 0]], dtype=np.float32)
-        log.debug(f"Applying shear factor of {shear_factor:.2f}.")
-        return cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    def preprocess_for_ocr(image: np.ndarray, shear_factor: float = 0.0, target_h: int = 60, padding: int = 10,
+                           scratch: dict | None = None) -> np.ndarray | None:
+        """
+        Fused normalize + shear correction + binarize for a single label image.
+        Converts to grayscale on the small source image, then resizes, pads and shears
+        in a single warpAffine, and finally applies Otsu's threshold.
+        If a scratch dict is given, the intermediate grayscale and warped buffers are kept in it
+        and written into again on the next call with the same image size. The returned image is always new.
+        """
+        if scratch is None:
+            scratch = {}
+        if image is None or image.size == 0:
+            log.error("Cannot preprocess an empty image.")
+            return None
+
+        conversion = ImagePreprocessor.GRAY_CONVERSIONS.get(image.shape[2]) if image.ndim == 3 else None
+        if conversion is not None:
+            gray = scratch['gray'] = cv2.cvtColor(image, conversion, dst=scratch.get('gray'))
+        elif image.ndim == 2:
+            # Keep the single warpAffine on its contiguous 8-bit fast path
+            gray = np.ascontiguousarray(image, dtype=np.uint8)
+        else:
+            log.error(f"Unsupported image shape for preprocessing: {image.shape}")
+            return None
+
+        M, out_size = ImagePreprocessor._normalize_transform(*gray.shape, target_h, padding, shear_factor)
+        warped = scratch['warp'] = cv2.warpAffine(gray, M, out_size, dst=scratch.get('warp'), flags=cv2.INTER_CUBIC,
+                                                  borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+        _, processed_image = cv2.threshold(warped, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        log.debug("Image preprocessed for OCR with shear factor %.2f.", shear_factor)
+        return processed_image
+
+    @staticmethod
+    def crop_to_content(binary_image: np.ndarray, margin: int = 10) -> np.ndarray:
+        """
+        Crops a binarized (dark text on white) image horizontally to the columns containing text,
+        keeping a white margin either side. Tesseract's cost scales with image area,
+        so trimming the empty background before OCR is cheap speed.
+        """
+        ink_columns = np.flatnonzero((binary_image < 128).any(axis=0))
+        if ink_columns.size == 0:
+            return binary_image
+        left = max(ink_columns[0] - margin, 0)
+        right = min(ink_columns[-1] + margin + 1, binary_image.shape[1])
+        log.debug("Cropped image to text columns %s-%s of %s.", left, right, binary_image.shape[1])
+        return binary_image[:, left:right]
 
     @staticmethod
     def upscale(image: np.ndarray, scale_factor: float) -> np.ndarray:
@@ -69,10 +154,11 @@ class ImagePreprocessor:
             if scale_factor < 1.0:
                 log.warning(f"Downscaling (factor {scale_factor}) is not supported by the upscale function. Returning unaltered image")
             return image
-        log.debug(f"Upscaling image by factor of {scale_factor}")
+        log.debug("Upscaling image by factor of %s", scale_factor)
         width = int(image.shape[1] * scale_factor)
         height = int(image.shape[0] * scale_factor)
-        return cv2.resize(image, (width, height), interpolation=cv2.INTER_CUBIC)
+        # Bilinear is OpenCV's fastest SIMD resize path for uint8, and the result is binarized right after.
+        return cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
 
     @staticmethod
     def mask_by_coloured_text(hsv_image: np.ndarray, saturation_threshold: int, value_threshold: int) -> np.ndarray:
@@ -96,17 +182,10 @@ class ImagePreprocessor:
             # Return an empty mask of the correct type to avoid downstream errors
             return np.zeros((0, 0), dtype=np.uint8)
 
-        # Create a mask for pixels with sufficient saturation (color)
-        saturation_channel = hsv_image[:, :, 1]
-        _, saturation_mask = cv2.threshold(saturation_channel, saturation_threshold, 255, cv2.THRESH_BINARY)
-
-        # Create a mask for pixels with sufficient value (brightness) to remove shadows
-        value_channel = hsv_image[:, :, 2]
-        _, value_mask = cv2.threshold(value_channel, value_threshold, 255, cv2.THRESH_BINARY)
-
-        # Combine the masks: a pixel must be both saturated AND bright
-        combined_mask = cv2.bitwise_and(saturation_mask, value_mask)
+        # A pixel must be both saturated (colour) AND bright (to remove shadows), at any hue.
+        # inRange is inclusive, so +1 keeps the strict "greater than" of a binary threshold.
+        combined_mask = cv2.inRange(hsv_image, (0, saturation_threshold + 1, value_threshold + 1), (255, 255, 255))
 
-        log.debug(f"Created colored text mask with sat_thresh={saturation_threshold}, val_thresh={value_threshold}.")
+        log.debug("Created colored text mask with sat_thresh=%s, val_thresh=%s.", saturation_threshold, value_threshold)
 
         return combined_mask
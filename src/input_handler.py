@@ -1,12 +1,89 @@
+import ctypes
+import functools
+import itertools
 import pydirectinput
 import logging
 import time
 
 log = logging.getLogger('csd2_bot')
 
+INPUT_KEYBOARD = 1
+EXTENDED_KEYS = ('up', 'left', 'down', 'right')
+VK_NUMLOCK = 0x90
+# With NumLock on, arrow keys need this extra scancode around them or they're read as numpad keys
+# https://stackoverflow.com/questions/14026496/sendinput-sends-num8-when-i-want-to-send-vk-up-how-come
+EXTENDED_KEY_PREFIX = 0xE0
+
+def _numlock_for(keys) -> bool:
+    """Returns True if any of the keys is an arrow key and NumLock is on, same check as pydirectinput."""
+    return any(key in EXTENDED_KEYS for key in keys) and bool(ctypes.windll.user32.GetKeyState(VK_NUMLOCK))
+
+@functools.lru_cache(maxsize=None)
+def _key_event_flags(key: str, numlock: bool = False) -> tuple[tuple[tuple[int, int], ...], tuple[tuple[int, int], ...]]:
+    """
+    Resolves a key name to its (scancode, flags) key down and key up events once.
+    Returns empty down and up events for keys without a scancode.
+    """
+    scancode = pydirectinput.KEYBOARD_MAPPING.get(key)
+    if scancode is None:
+        log.warning(f"No scancode mapping for key '{key}'")
+        return (), ()
+    flags = pydirectinput.KEYEVENTF_SCANCODE
+    up_flags = flags | pydirectinput.KEYEVENTF_KEYUP
+    if key not in EXTENDED_KEYS:
+        return ((scancode, flags),), ((scancode, up_flags),)
+    extended = pydirectinput.KEYEVENTF_EXTENDEDKEY
+    if not numlock:
+        return ((scancode, flags | extended),), ((scancode, up_flags | extended),)
+    return (((EXTENDED_KEY_PREFIX, flags), (scancode, flags | extended)),
+            ((scancode, up_flags | extended), (EXTENDED_KEY_PREFIX, up_flags)))
+
+def _build_key_events(keys, numlock: bool = False) -> ctypes.Array:
+    """
+    Builds a contiguous INPUT array with a key down and key up event for each key,
+    using the same scancode mapping and structures as pydirectinput.
+    Keys without a scancode are skipped.
+    """
+    events = [event for key in keys for half in _key_event_flags(key, numlock) for event in half]
+    return _build_inputs(events)
+
+def _build_inputs(events: list[tuple[int, int]]) -> ctypes.Array:
+    """Builds a contiguous INPUT array from (scancode, flags) keyboard events."""
+    inputs = (pydirectinput.Input * len(events))()
+    for i, (scancode, flags) in enumerate(events):
+        inputs[i].type = INPUT_KEYBOARD
+        inputs[i].ii.ki = pydirectinput.KeyBdInput(0, scancode, flags, 0, None)
+    return inputs
+
+@functools.lru_cache(maxsize=None)
+def _hold_key_events(key: str, numlock: bool = False) -> tuple[ctypes.Array, ctypes.Array]:
+    """Cached separate key down and key up INPUT arrays for one key. Only read by SendInput, so they're safe to reuse."""
+    down_events, up_events = _key_event_flags(key, numlock)
+    return _build_inputs(down_events), _build_inputs(up_events)
+
+def _send_events(inputs: ctypes.Array) -> bool:
+    """Sends an INPUT array in a single SendInput call. Returns True if every event was inserted."""
+    if len(inputs) == 0:
+        return False
+    inserted = pydirectinput.SendInput(len(inputs), inputs, ctypes.sizeof(pydirectinput.Input))
+    return inserted == len(inputs)
+
+def _tap_key(key: str, numlock: bool, key_delay: float) -> bool:
+    """
+    Presses one key, holding it down for key_delay and waiting key_delay after releasing it.
+    Checks the failsafe first, like pydirectinput.press does before every key.
+    """
+    pydirectinput.failSafeCheck()
+    down_events, up_events = _hold_key_events(key, numlock)
+    down_success = _send_events(down_events)
+    time.sleep(key_delay)
+    up_success = _send_events(up_events)
+    time.sleep(key_delay)
+    return down_success and up_success
+
 def press_key(keys: str):
     """
-    Presses a key or list of keys using pydirectinput
+    Presses a key or list of keys using SendInput
     converts all keys to lower case
     Logs the action.
     """
@@ -17,22 +94,64 @@ def press_key(keys: str):
     if type(keys) == str:
         keys = [keys]
 
+    # Convert all keys to lowercase to ensure compatibility.
+    # Games often expect the base key press (e.g., 'a') rather than a shifted one ('A').
     keys = [key.lower() for key in keys]
 
 
     try:
-        # Convert all keys to lowercase to ensure compatibility.
-        # Games often expect the base key press (e.g., 'a') rather than a shifted one ('A').
-        success = pydirectinput.press(keys)
+        key_delay = pydirectinput.PAUSE
+        numlock = _numlock_for(keys)
+        if key_delay:
+            # The game polls key state, so hold each key for key_delay and leave the same gap
+            # before the next one, like pydirectinput.press
+            success = True
+            for key in keys:
+                success = _tap_key(key, numlock, key_delay) and success
+        else:
+            pydirectinput.failSafeCheck()
+            success = _send_events(_build_key_events(keys, numlock))
         # Log the actual key being sent to the input handler
         if success:
-            log.debug(f"Pressed key: {keys}")
+            log.debug("Pressed key: %s", keys)
         else:
             log.warning(f"Failed to press key {keys}")
 
     except Exception as e:
         log.error(f"Failed to press key '{keys}': {e}")
 
+def press_key_runs(key_runs: list[tuple[str, int]]):
+    """
+    Presses each key in a list of (key, count) runs count times, in order,
+    without expanding the runs into a flat list of keys first.
+    Logs the action.
+    """
+    if len(key_runs) == 0:
+        log.debug("No keys to press")
+        return
+
+    key_runs = [(key.lower(), count) for key, count in key_runs]
+
+    try:
+        key_delay = pydirectinput.PAUSE
+        numlock = _numlock_for(key for key, _ in key_runs)
+        if key_delay:
+            success = True
+            for key, count in key_runs:
+                for _ in range(count):
+                    success = _tap_key(key, numlock, key_delay) and success
+        else:
+            pydirectinput.failSafeCheck()
+            keys = itertools.chain.from_iterable(itertools.repeat(key, count) for key, count in key_runs)
+            success = _send_events(_build_key_events(keys, numlock))
+        if success:
+            log.debug("Pressed keys: %s", key_runs)
+        else:
+            log.warning(f"Failed to press keys {key_runs}")
+
+    except Exception as e:
+        log.error(f"Failed to press keys '{key_runs}': {e}")
+
 
 def hold_key(key, seconds):
     """
@@ -40,11 +159,16 @@ def hold_key(key, seconds):
     """
     key = key.lower()
 
-    down_success = pydirectinput.keyDown(key)
-    time.sleep(seconds)
-    up_success = pydirectinput.keyUp(key)
+    pydirectinput.failSafeCheck()
+    key_delay = pydirectinput.PAUSE or 0
+    down_events, up_events = _hold_key_events(key, _numlock_for([key]))
+    # Same timing as pydirectinput.keyDown/keyUp, which each wait PAUSE after sending
+    down_success = _send_events(down_events)
+    time.sleep(key_delay + seconds)
+    up_success = _send_events(up_events)
+    time.sleep(key_delay)
 
     if down_success and up_success:
-        log.debug(f"Held Key {key} for {seconds} s")
+        log.debug("Held Key %s for %s s", key, seconds)
     else:
         log.warning(f"Failed to hold key {key}")
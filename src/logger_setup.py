@@ -8,6 +8,13 @@ def setup_logger(config: ConfigManager, log_file: str = 'bot_activity.log'):
     log_level_str = config.get_setting("bot_settings.logging_level", default="INFO").upper()
     log_level = getattr(logging, log_level_str, logging.INFO)
 
+    # None of the formatters below use thread, process or source location, so skip collecting them
+    # (the source lookup walks the stack on every record).
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging._srcfile = None
+
     logger = logging.getLogger('csd2_bot')
     logger.setLevel(log_level)
 
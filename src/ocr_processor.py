@@ -1,6 +1,12 @@
 import cv2
 import numpy as np
+import hashlib
 import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union, List
 from pathlib import Path
 from datetime import datetime
@@ -14,11 +20,14 @@ log = logging.getLogger('csd2_bot')
 
 class OcrProcessor:
     """Orchestrates screen capture, image processing, and text recognition for the game."""
+    OCR_CACHE_SIZE = 512
+
     def __init__(self, config_manager: ConfigManager):
         self.config_manager = config_manager
         self.text_parser = TextParser(config_manager)
-        label_mask_path = self.config_manager.get_setting("bot_settings.ingredient_mask_path")
-        self.label_mask = cv2.imread(label_mask_path, cv2.IMREAD_GRAYSCALE)
+        # Successful reads keyed by a hash of the preprocessed image. Shared with the OCR pool threads.
+        self._ocr_cache_lock = threading.Lock()
+        self.reload_settings()
         
         # --- Page Color Definitions ---
         # Using hardcoded values as requested. These could be moved to config.json later.
@@ -29,58 +38,127 @@ class OcrProcessor:
         }
         # Red's hue is circular (0-179), so it needs a check at the top of the range too.
         self.PAGE_HUE_RANGES_RED_UPPER = (175, 179)
+        # Page for every possible hue byte, so classifying the indicators is a single lookup.
+        # Filled in reverse so the first matching range wins, as before.
+        self._page_by_hue = np.zeros(256, dtype=np.int8)
+        lower_red, upper_red = self.PAGE_HUE_RANGES_RED_UPPER
+        self._page_by_hue[lower_red:upper_red + 1] = 2
+        for page_num, (lower, upper) in reversed(self.PAGE_HUE_RANGES.items()):
+            self._page_by_hue[lower:upper + 1] = page_num
         self.EMPTY_SLOT_SATURATION_THRESHOLD = 50
 
-    def _is_slot_empty(self, hsv_image: np.ndarray, roi: dict) -> bool:
-        """Checks if a recipe slot is empty by checking the saturation of the middle pixel."""
-        x, y, w, h = roi['left'], roi['top'], roi['width'], roi['height']
-        middle_x, middle_y = x + w // 2, y + h // 2
-        
-        if not (0 <= middle_y < hsv_image.shape[0] and 0 <= middle_x < hsv_image.shape[1]):
-            log.warning(f"Middle pixel ({middle_x}, {middle_y}) for ROI {roi} is out of bounds for image shape {hsv_image.shape}.")
-            return True # Treat out-of-bounds as empty
+        # Last ingredient panel that was OCR'd, so an unchanged panel isn't read twice
+        self._last_panel_image = None
+        self._last_panel_key = None
+        self._last_panel_result = None
 
-        saturation = hsv_image[middle_y, middle_x][1]
-        return saturation < self.EMPTY_SLOT_SATURATION_THRESHOLD
+        # Recipe slots are OCR'd concurrently. Tesseract runs in its own process (pytesseract) or
+        # without the GIL on a per-thread instance (tesserocr), and OpenCV releases the GIL, so threads are enough.
+        self._ocr_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
 
-    def _get_page_from_hue(self, hsv_image: np.ndarray, roi: dict) -> int:
-        """Determines the page number (1, 2, or 3) from the hue of the middle pixel."""
-        x, y, w, h = roi['left'], roi['top'], roi['width'], roi['height']
-        middle_x, middle_y = x + w // 2, y + h // 2
+        # Intermediate buffers reused across ingredient slots, which all share one size
+        self._slot_scratch = {}
 
-        if not (0 <= middle_y < hsv_image.shape[0] and 0 <= middle_x < hsv_image.shape[1]):
-            return 0 # Unknown page
+        # Failed reads are written to disk by a background thread, so PNG encoding stays off the OCR path.
+        self._failed_image_queue = queue.Queue(maxsize=64)
+        threading.Thread(target=self._write_failed_ocr_images, name="ocr-fail-writer", daemon=True).start()
 
-        hue = hsv_image[middle_y, middle_x][0]
+    def reload_settings(self):
+        """(Re)reads the settings used on every capture, so the hot paths don't walk the config."""
+        label_mask_path = self.config_manager.get_setting("bot_settings.ingredient_mask_path")
+        self.label_mask = cv2.imread(label_mask_path, cv2.IMREAD_GRAYSCALE)
+        self._min_conf = self.config_manager.get_setting("bot_settings.min_confidence", default=50)
+        self._shear_factor = self.config_manager.get_setting("bot_settings.right_panel_shear_factor", default=0.14)
+        self._ocr_scale = self.config_manager.get_setting("bot_settings.ocr_upscale_factor", default=1.0)
+        self._recipe_indicator_rois = self.config_manager.get_setting("recipe_layout.recipe_indicator_rois")
+        self._recipe_slot_rois = self.config_manager.get_setting("recipe_layout.recipe_slot_rois")
+        self._vertical_coords = self.config_manager.get_setting("recipe_layout.vertical_coords")
+        self.text_parser.reload_settings()
+        # Cached reads depend on the settings above (e.g. min_confidence), so start afresh.
+        with self._ocr_cache_lock:
+            self._ocr_cache = OrderedDict()
+
+    @staticmethod
+    def _ocr_cache_key(kind: str, image: np.ndarray) -> tuple:
+        """Identifies a preprocessed image by its kind (which sets the OCR mode), shape and a fast content hash."""
+        return kind, image.shape, hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+
+    def _get_cached_ocr(self, key: tuple) -> tuple[str, float] | None:
+        """Returns the cached (text, confidence) for a preprocessed image, or None."""
+        with self._ocr_cache_lock:
+            result = self._ocr_cache.get(key)
+            if result is not None:
+                self._ocr_cache.move_to_end(key)
+            return result
+
+    def _cache_ocr(self, key: tuple, result: tuple[str, float]):
+        """Stores a successful read, evicting the least recently used one when full."""
+        with self._ocr_cache_lock:
+            self._ocr_cache[key] = result
+            self._ocr_cache.move_to_end(key)
+            if len(self._ocr_cache) > self.OCR_CACHE_SIZE:
+                self._ocr_cache.popitem(last=False)
+
+    def clear_panel_cache(self):
+        """Forgets the last processed ingredient panel. Call between recipes."""
+        self._last_panel_image = None
+        self._last_panel_key = None
+        self._last_panel_result = None
+
+    def _classify_indicator_slots(self, hsv_image: np.ndarray, rois: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Classifies every recipe indicator at once from the HSV of its middle pixel.
 
-        for page, (lower, upper) in self.PAGE_HUE_RANGES.items():
-            if lower <= hue <= upper:
-                return page
-        
+        Returns:
+            (is_empty, page) arrays. A slot is empty if its saturation is below the threshold
+            (or its middle pixel is out of bounds). Page is 1, 2 or 3 from the hue, or 0 if unknown.
+        """
+        middle_x = np.array([roi['left'] + roi['width'] // 2 for roi in rois], dtype=np.intp)
+        middle_y = np.array([roi['top'] + roi['height'] // 2 for roi in rois], dtype=np.intp)
+        in_bounds = (0 <= middle_y) & (middle_y < hsv_image.shape[0]) & (0 <= middle_x) & (middle_x < hsv_image.shape[1])
+
+        # Gather one pixel per slot in a single indexing op; out-of-bounds slots read (0, 0) and are masked off.
+        pixels = hsv_image[np.where(in_bounds, middle_y, 0), np.where(in_bounds, middle_x, 0)]
+        hue, saturation = pixels[:, 0], pixels[:, 1]
+        is_empty = ~in_bounds | (saturation < self.EMPTY_SLOT_SATURATION_THRESHOLD)
+
+        # Slots are read up to the first empty one, so only that slot can be reported as out of bounds
+        first_empty = int(np.argmax(is_empty)) if is_empty.any() else None
+        if first_empty is not None and not in_bounds[first_empty]:
+            log.warning(f"Middle pixel ({middle_x[first_empty]}, {middle_y[first_empty]}) for ROI {rois[first_empty]} "
+                        f"is out of bounds for image shape {hsv_image.shape}.")
+
+        page = self._page_by_hue[hue]
         lower_red, upper_red = self.PAGE_HUE_RANGES_RED_UPPER
-        if lower_red <= hue <= upper_red:
+        if ((lower_red <= hue) & (hue <= upper_red) & (page == 2)).any():
             log.info("Red Upper range used for page determiniation")
-            return 2 # Page 2 (Red)
+        page[~in_bounds] = 0
+        return is_empty, page
 
-        return 0 # Unknown page
-
-    def _ocr_single_slot(self, image_slice: np.ndarray) -> str:
-        """Performs the full OCR pipeline on a single recipe slot image."""
-        processed_image = ImagePreprocessor.binarize(image_slice, invert_colors=True)
-        processed_image = ImagePreprocessor.normalize(processed_image)
+    def _ocr_single_slot(self, image_slice: np.ndarray, threshold: float | None = None) -> str:
+        """Performs the full OCR pipeline on a single recipe slot image, at the given threshold or Otsu's."""
+        processed_image = ImagePreprocessor.binarize(image_slice, invert_colors=True, threshold=threshold)
         
         if processed_image is None or processed_image.size == 0:
             log.warning("Empty image passed to processor")
             return ""
 
+        processed_image = ImagePreprocessor.crop_to_content(processed_image, margin=2)
+        processed_image = ImagePreprocessor.normalize(processed_image)
+
+        cache_key = self._ocr_cache_key('recipe_slot', processed_image)
+        cached = self._get_cached_ocr(cache_key)
+        if cached is not None:
+            return cached[0]
 
         ocr_data = self.text_parser.extract_structured_data(processed_image, psm=7) # PSM 7 for single line
-        min_conf = self.config_manager.get_setting("bot_settings.min_confidence", default=50)
-        
-        parsed_text, confidence = self.text_parser.parse_as_single_phrase(ocr_data, min_confidence=min_conf, return_confidence=True)
-        log.debug(f"{parsed_text}, {confidence}")
+        parsed_text, confidence = self.text_parser.parse_as_single_phrase(ocr_data, min_confidence=self._min_conf, return_confidence=True)
+        log.debug("%s, %s", parsed_text, confidence)
 
-        if not parsed_text:
+        if parsed_text:
+            # Failed reads aren't cached, so a transient misread gets another try
+            self._cache_ocr(cache_key, (parsed_text, confidence))
+        else:
             self._save_failed_ocr_image(image_slice)
             self._save_failed_ocr_image(processed_image)
             debug_text, confidence = self.text_parser.parse_as_single_phrase(ocr_data, min_confidence=0, return_confidence=True)
@@ -89,18 +167,26 @@ class OcrProcessor:
         return parsed_text
 
     def _save_failed_ocr_image(self, image: np.ndarray):
-        """Saves an image that failed OCR to a debug directory."""
-        fails_dir = Path("debug/ocr_fails")
-        fails_dir.mkdir(parents=True, exist_ok=True)
+        """Queues an image that failed OCR to be saved to a debug directory."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        filename = fails_dir / f"failed_recipe_slot_{timestamp}.png"
         try:
-            cv2.imwrite(str(filename), image)
-            log.info(f"Saved failing OCR image to: {filename}")
-        except Exception as e:
-            log.error(f"Could not save failing OCR image to {filename}. Error: {e}")
-
+            # Copied, as the caller may reuse the buffer (e.g. the slot scratch) before it's written.
+            self._failed_image_queue.put_nowait((f"failed_recipe_slot_{timestamp}.png", image.copy()))
+        except queue.Full:
+            log.warning("Failed OCR image queue is full. Dropping image.")
 
+    def _write_failed_ocr_images(self):
+        """Background worker that saves queued failed OCR images."""
+        fails_dir = Path("debug/ocr_fails")
+        while True:
+            name, image = self._failed_image_queue.get()
+            filename = fails_dir / name
+            try:
+                fails_dir.mkdir(parents=True, exist_ok=True)
+                cv2.imwrite(str(filename), image)
+                log.info(f"Saved failing OCR image to: {filename}")
+            except Exception as e:
+                log.error(f"Could not save failing OCR image to {filename}. Error: {e}")
 
     def process_recipe_list_roi(self, roi: dict) -> List[List[str]]:
         """
@@ -118,39 +204,56 @@ class OcrProcessor:
             log.warning("Failed to capture recipe panel image.")
             return final_structure
 
-        panel_image_bgr = cv2.cvtColor(panel_image_bgra, cv2.COLOR_BGRA2BGR)
-        panel_image_hsv = cv2.cvtColor(panel_image_bgr, cv2.COLOR_BGR2HSV)
+        # BGR2HSV reads the first three channels of a BGRA image, so no BGR copy is needed.
+        # Slot crops stay BGRA too; binarize converts them to gray with the same result.
+        panel_image_hsv = cv2.cvtColor(panel_image_bgra, cv2.COLOR_BGR2HSV)
 
-        recipe_indicator_rois = self.config_manager.get_setting("recipe_layout.recipe_indicator_rois")
-        recipe_slot_rois = self.config_manager.get_setting("recipe_layout.recipe_slot_rois")
+        recipe_indicator_rois = self._recipe_indicator_rois
+        recipe_slot_rois = self._recipe_slot_rois
 
         if not recipe_indicator_rois:
             log.error("`recipe_indicator_rois` not found in config. Run setup.py.")
             return final_structure
 
         num_steps_found = 0
-        for indicator_roi, slot_roi in zip(recipe_indicator_rois, recipe_slot_rois):
-            if self._is_slot_empty(panel_image_hsv, indicator_roi):
-                log.debug(f"{num_steps_found} steps found in recipe panel")
+        slot_pages, slot_images = [], []
+        slots_empty, slot_page_nums = self._classify_indicator_slots(panel_image_hsv, recipe_indicator_rois)
+        for indicator_roi, slot_roi, is_empty, page_num in zip(recipe_indicator_rois, recipe_slot_rois, slots_empty, slot_page_nums):
+            if is_empty:
+                log.debug("%s steps found in recipe panel", num_steps_found)
                 break
 
             num_steps_found += 1
-            page_num = self._get_page_from_hue(panel_image_hsv, indicator_roi)
+            page_num = int(page_num)
 
             if page_num == 0:
                 log.warning(f"Could not determine page number for recipe slot at {indicator_roi}. Skipping.")
                 continue
 
             x, y, w, h = slot_roi['left'], slot_roi['top'], slot_roi['width'], slot_roi['height']
-            slot_image = panel_image_bgr[y:y+h, x:x+w]
-
-            ocr_text = self._ocr_single_slot(slot_image)
-
+            slot_pages.append(page_num)
+            slot_images.append(panel_image_bgra[y:y+h, x:x+w])
+
+        # The filled slots share one background, so a single Otsu threshold over the strip
+        # that spans them replaces a histogram pass per slot.
+        threshold = None
+        if slot_images:
+            used_rois = recipe_slot_rois[:num_steps_found]
+            top = min(r['top'] for r in used_rois)
+            bottom = max(r['top'] + r['height'] for r in used_rois)
+            left = min(r['left'] for r in used_rois)
+            right = max(r['left'] + r['width'] for r in used_rois)
+            strip_gray = cv2.cvtColor(panel_image_bgra[top:bottom, left:right], cv2.COLOR_BGRA2GRAY)
+            threshold, _ = cv2.threshold(strip_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        # map() keeps the slot order, so steps are still appended in recipe order.
+        slot_text = self._ocr_pool.map(self._ocr_single_slot, slot_images, [threshold] * len(slot_images))
+        for page_num, ocr_text in zip(slot_pages, slot_text):
             if ocr_text:
                 recipe_pages[page_num - 1].append(ocr_text)
 
 
-        vertical_coords = self.config_manager.get_setting("recipe_layout.vertical_coords")
+        vertical_coords = self._vertical_coords
         if not vertical_coords:
             log.error("`vertical_coords` not found in config. Run setup.py.")
             return final_structure
@@ -172,16 +275,14 @@ class OcrProcessor:
         extra_image = panel_image_hsv[extra_top:extra_bottom, :]
         extra_image = ImagePreprocessor.mask_by_coloured_text(extra_image, 38, 200)
 
-        scale_factor = self.config_manager.get_setting("bot_settings.ocr_upscale_factor", default=1.0)
-        upscaled_image = ImagePreprocessor.upscale(extra_image, scale_factor)
+        upscaled_image = ImagePreprocessor.upscale(extra_image, self._ocr_scale)
         processed_image = ImagePreprocessor.binarize(upscaled_image, invert_colors=True)
         
         if processed_image is not None and processed_image.size > 0:
             ocr_data = self.text_parser.extract_structured_data(processed_image, psm=6)
-            min_conf = self.config_manager.get_setting("bot_settings.min_confidence", default=50)
-            final_structure[3] = self.text_parser.parse_as_ingredient_list(ocr_data, min_confidence=min_conf)
+            final_structure[3] = self.text_parser.parse_as_ingredient_list(ocr_data, min_confidence=self._min_conf)
 
-        log.debug(f"Processed recipe panel. Page 1: {final_structure[0]}, Page 2: {final_structure[1]}, Page 3: {final_structure[2]}, Extra: {final_structure[3]}")
+        log.debug("Processed recipe panel. Page 1: %s, Page 2: %s, Page 3: %s, Extra: %s", final_structure[0], final_structure[1], final_structure[2], final_structure[3])
         return final_structure
 
 
@@ -201,24 +302,41 @@ class OcrProcessor:
         if panel_image is None:
             return []
 
-        results = []
+        # Identical pixels give identical OCR output, so skip Tesseract if nothing has changed.
+        cache_key = (repr(relative_ingredient_slot_rois), return_confidence)
+        if (self._last_panel_image is not None and cache_key == self._last_panel_key
+                and np.array_equal(panel_image, self._last_panel_image)):
+            log.debug("Ingredient panel unchanged since last read. Reusing result.")
+            return list(self._last_panel_result)
+
+        # First pass: pre-process every label, then OCR them all with a single Tesseract call.
+        # Each entry is either None (a placeholder for an unreadable slot) or a processed label image.
+        slot_images = []
         end_of_panel = 0
+
+        # Heuristic to detect if an ingredient slot is empty. Empty slots are
+        # assumed to be a solid grey, whereas full slots have black text on a white background.
+        # Gather every slot's top-left BGR pixel at once and classify them together, ignoring alpha.
+        panel_h, panel_w = panel_image.shape[:2]
+        tops = np.clip([roi['top'] for roi in relative_ingredient_slot_rois], 0, panel_h - 1).astype(np.intp)
+        lefts = np.clip([roi['left'] for roi in relative_ingredient_slot_rois], 0, panel_w - 1).astype(np.intp)
+        top_left_pixels = panel_image[tops, lefts, :3]
+        is_label_slot = (top_left_pixels == 255).all(axis=1) | (top_left_pixels == 0).all(axis=1)
+
+        # Labels are grey (B == G == R), so the blue channel is their grayscale. Take it once for
+        # the whole panel; the per-label mask, warp and threshold then all run on one channel.
+        panel_gray = self._slot_scratch['panel_gray'] = cv2.extractChannel(panel_image, 0, dst=self._slot_scratch.get('panel_gray'))
+
         for i, slot_roi in enumerate(relative_ingredient_slot_rois):
             y, x, w, h = slot_roi['top'], slot_roi['left'], slot_roi['width'], slot_roi['height']
-            item_image = panel_image[y:y+h, x:x+w]
+            item_image = panel_gray[y:y+h, x:x+w]
 
             if item_image.size == 0:
                 log.warning(f"Ingredient slot ROI is malformed or has size 0: {slot_roi}")
-                results.append(null_result)
+                slot_images.append(None)
                 continue
 
-            # Heuristic to detect if an ingredient slot is empty. Empty slots are
-            # assumed to be a solid grey, whereas full slots have black text on a white background
-            # We check the top-left pixel's BGR values, ignoring alpha.
-            top_left_pixel = item_image[0, 0]
-            is_white = np.all(top_left_pixel[:3] == 255)
-            is_black = np.all(top_left_pixel[:3] == 0)
-            if not is_white and not is_black:
+            if not is_label_slot[i]:
                 log.debug("Skipping empty ingredient slot (detected as non-white/black).")
                 end_of_panel = i
                 
@@ -226,22 +344,46 @@ class OcrProcessor:
             elif end_of_panel:
                 # Thought it was the end of the panel but we were wrong
                 log.warning("Missed Panel")
-                results.extend([null_result]*(i-end_of_panel))
+                slot_images.extend([None]*(i-end_of_panel))
                 end_of_panel = 0
 
             # Where the mask is white, use the pixel from item_image. Where black, use white.
-            masked_image = np.where(self.label_mask[:, :, None] == 255, item_image, 255)
+            # Every slot uses the same mask, so the unmasked pixels of the reused canvas stay white.
+            masked_image = self._slot_scratch.get('label')
+            if masked_image is None or masked_image.shape != item_image.shape:
+                masked_image = self._slot_scratch['label'] = np.full(item_image.shape, 255, dtype=np.uint8)
+            cv2.copyTo(item_image, self.label_mask, masked_image)
+
+            processed_image = ImagePreprocessor.preprocess_for_ocr(masked_image, self._shear_factor, scratch=self._slot_scratch)
+            processed_image = ImagePreprocessor.crop_to_content(processed_image)
+            slot_images.append(processed_image)
+
+        # Labels read before come from the cache; only the rest go to Tesseract, still in one call.
+        labels = [image for image in slot_images if image is not None]
+        label_keys = [self._ocr_cache_key('ingredient_label', image) for image in labels]
+        label_reads = [self._get_cached_ocr(key) for key in label_keys]
+        uncached = [i for i, read in enumerate(label_reads) if read is None]
+        if uncached:
+            stacked_ocr_data = self.text_parser.extract_structured_data_stacked([labels[i] for i in uncached], psm=6)
+            uncached_ocr_data = dict(zip(uncached, stacked_ocr_data))
+
+        results = []
+        label_index = -1
+        for processed_image in slot_images:
+            if processed_image is None:
+                results.append(null_result)
+                continue
 
-            normalized_img = ImagePreprocessor.normalize(masked_image)
-            processed_image = ImagePreprocessor.binarize(normalized_img, invert_colors=False)
-            
-            shear_factor = self.config_manager.get_setting("bot_settings.right_panel_shear_factor", default=0.14)
-            processed_image = ImagePreprocessor.correct_shear(processed_image, shear_factor)
+            label_index += 1
+            if label_reads[label_index] is not None:
+                parsed_phrase, confidence = label_reads[label_index]
+                results.append((parsed_phrase, confidence) if return_confidence else parsed_phrase)
+                continue
 
-            ocr_data = self.text_parser.extract_structured_data(processed_image, psm=7)
-            min_conf = self.config_manager.get_setting("bot_settings.min_confidence", default=50)
-            parsed_phrase, confidence = self.text_parser.parse_as_single_phrase(ocr_data, min_confidence=min_conf, return_confidence=True)
+            ocr_data = uncached_ocr_data[label_index]
+            parsed_phrase, confidence = self.text_parser.parse_as_single_phrase(ocr_data, min_confidence=self._min_conf, return_confidence=True)
             if parsed_phrase:
+                self._cache_ocr(label_keys[label_index], (parsed_phrase, confidence))
                 results.append((parsed_phrase, confidence) if return_confidence else parsed_phrase)
             else:
                 log.warning("Label detected but no text found with sufficient confidence.")
@@ -250,5 +392,8 @@ class OcrProcessor:
                 log.warning(f"Best Guess: {debug_phrase} with confidence {confidence}")
                 results.append(null_result)
 
-        log.debug(f"Processed ingredient panel. Found: {results}")
+        log.debug("Processed ingredient panel. Found: %s", results)
+        self._last_panel_image = panel_image
+        self._last_panel_key = cache_key
+        self._last_panel_result = list(results)
         return results
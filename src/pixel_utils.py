@@ -0,0 +1,16 @@
+# Same fixed-point reciprocal table OpenCV uses for 8-bit BGR -> HSV saturation
+_SATURATION_DIV_TABLE = [0] + [round((255 << 12) / v) for v in range(1, 256)]
+
+def color_within_tolerance(rgb: tuple, expected_rgb: tuple, tolerance: int) -> bool:
+    """Returns True if every channel of rgb is within tolerance of expected_rgb."""
+    r, g, b = rgb
+    expected_r, expected_g, expected_b = expected_rgb
+    return abs(r - expected_r) <= tolerance and abs(g - expected_g) <= tolerance and abs(b - expected_b) <= tolerance
+
+def saturation(b: int, g: int, r: int) -> int:
+    """
+    Computes the HSV saturation (0-255) of a single BGR pixel.
+    Matches OpenCV's 8-bit COLOR_BGR2HSV saturation without the cvtColor call overhead.
+    """
+    max_value = max(r, g, b)
+    return ((max_value - min(r, g, b)) * _SATURATION_DIV_TABLE[max_value] + (1 << 11)) >> 12
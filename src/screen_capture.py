@@ -1,22 +1,72 @@
+import atexit
+import threading
 import mss
 import numpy as np
 import logging
 
 log = logging.getLogger('csd2_bot')
 
+# mss instances hold OS handles (a GDI device context on Windows) and must stay on the
+# thread that created them, so each capturing thread keeps its own, created on first use.
+_thread_local = threading.local()
+_open_instances = []
+
+
+def _get_sct():
+    """Returns this thread's mss instance, creating it on first use."""
+    sct = getattr(_thread_local, 'sct', None)
+    if sct is None:
+        sct = _thread_local.sct = mss.mss()
+        _open_instances.append(sct)
+    return sct
+
+
+@atexit.register
+def _close_instances():
+    """Releases every mss instance when the process exits."""
+    for sct in _open_instances:
+        try:
+            sct.close()
+        except Exception:
+            pass
+    _open_instances.clear()
+
+
+def primary_monitor() -> dict:
+    """Returns the primary monitor's region ('top', 'left', 'width', 'height')."""
+    # monitors[0] is the union of all monitors
+    return _get_sct().monitors[1]
+
+
+def grab_raw(roi: dict) -> bytearray:
+    """
+    Grabs a screen region with this thread's mss instance and returns its packed BGRA bytes.
+    Raises mss.exception.ScreenShotError if the capture fails.
+    """
+    return _get_sct().grab(roi).raw
+
+
+def grab_image(roi: dict) -> np.ndarray:
+    """
+    Grabs a screen region as a BGRA NumPy array backed by the screenshot's buffer.
+    Raises mss.exception.ScreenShotError if the capture fails.
+    """
+    sct_img = _get_sct().grab(roi)
+    # View the BGRA bytes in place: each grab returns a fresh (writable) bytearray,
+    # so there's no need for np.array's extra copy.
+    return np.frombuffer(sct_img.raw, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
+
+
 def capture_region(roi: dict) -> np.ndarray | None:
     """
     Captures a specific region of the screen.
     The ROI should be a dictionary with 'top', 'left', 'width', 'height'.
-    Returns the captured image as a NumPy array.
+    Returns the captured image as a BGRA NumPy array backed by the screenshot's buffer.
     """
     try:
-        with mss.mss() as sct:
-            sct_img = sct.grab(roi)
-            # Convert to a NumPy array
-            img = np.array(sct_img) # BGRA format
-            log.debug(f"Captured screen region at {roi}")
-            return img
+        img = grab_image(roi)
+        log.debug("Captured screen region at %s", roi)
+        return img
     except mss.exception.ScreenShotError as e:
         log.error(f"Failed to capture screen region at {roi}: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -1,17 +1,70 @@
+import atexit
+import bisect
+import functools
+import os
+import sys
+import threading
+from pathlib import Path
+import numpy as np
+
+# Tesseract's OpenMP pool costs more than it saves on small single-line images, and recipe
+# slots already run several single-threaded Tesseract calls in parallel.
+# Set here, before pytesseract is imported, so every entry point (bot, setup, test tools) gets it.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
 import pytesseract
 from pytesseract import Output
+from PIL import Image
 import logging
+
+# Optional: tesserocr runs Tesseract in-process, avoiding a subprocess and temp files per image.
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 from typing import Union
 from src.config_manager import ConfigManager
 
 log = logging.getLogger('csd2_bot')
 
+# Header of Tesseract's TSV output; tesserocr returns the rows only.
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+# Every tesserocr instance created, so they can all be shut down at exit
+_open_apis = []
+
+
+@atexit.register
+def _end_apis():
+    """Releases every tesserocr instance when the process exits."""
+    for api in _open_apis:
+        try:
+            api.End()
+        except Exception:
+            pass
+    _open_apis.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def tesseract_config(psm: int) -> str:
+    """pytesseract config for a page segmentation mode (7: single line, 6: block), built once per mode."""
+    return f"--oem 1 --psm {psm} -c tessedit_do_invert=0"
+
 class TextParser:
     """Handles Tesseract configuration, execution, and parsing of OCR data."""
 
     def __init__(self, config_manager: ConfigManager):
         self.config_manager = config_manager
+        # One tesserocr instance per thread (they aren't thread-safe), created on first use.
+        self._tesserocr_local = threading.local()
+        self._tessdata_path = None
+        self._use_tesserocr = False
         self._configure_tesseract()
+        self.reload_settings()
+
+    def reload_settings(self):
+        """(Re)reads the parsing settings, so parsing doesn't walk the config on every call."""
+        self._horizontal_gap_threshold = self.config_manager.get_setting("bot_settings.panel_detection.horizontal_gap_threshold", default=30)
 
     def _configure_tesseract(self):
         """Sets the Tesseract command path from the config file."""
@@ -19,9 +72,56 @@ class TextParser:
             tesseract_path = self.config_manager.get_setting("bot_settings.tesseract_path")
             if tesseract_path:
                 pytesseract.pytesseract.tesseract_cmd = tesseract_path
-            log.debug(f"Tesseract path set to: {pytesseract.pytesseract.tesseract_cmd}")
+            log.debug("Tesseract path set to: %s", pytesseract.pytesseract.tesseract_cmd)
         except Exception as e:
             log.error(f"Could not set Tesseract path from config. Ensure it's in your system PATH. Error: {e}")
+            tesseract_path = None
+
+        if tesserocr is None:
+            return
+        # A configured tesseract.exe keeps its language data next to it.
+        if tesseract_path and (Path(tesseract_path).parent / "tessdata").is_dir():
+            self._tessdata_path = str(Path(tesseract_path).parent / "tessdata")
+        try:
+            self._get_tesserocr_api()
+            self._use_tesserocr = True
+            log.debug("Using in-process Tesseract (tesserocr).")
+        except Exception as e:
+            log.warning(f"tesserocr is installed but could not be initialised, falling back to pytesseract. Error: {e}")
+
+    def _get_tesserocr_api(self):
+        """Returns this thread's tesserocr instance, creating it on first use."""
+        api = getattr(self._tesserocr_local, 'api', None)
+        if api is None:
+            kwargs = {'path': self._tessdata_path} if self._tessdata_path else {}
+            api = tesserocr.PyTessBaseAPI(lang='eng', oem=tesserocr.OEM.LSTM_ONLY, **kwargs)
+            api.SetVariable("tessedit_do_invert", "0")
+            self._tesserocr_local.api = api
+            _open_apis.append(api)
+        return api
+
+    def _image_to_data_in_process(self, image: np.ndarray, psm: int) -> dict:
+        """tesserocr equivalent of pytesseract.image_to_data(..., output_type=Output.DICT)."""
+        api = self._get_tesserocr_api()
+        api.SetPageSegMode(psm)
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, image.strides[0])
+        return pytesseract.pytesseract.file_to_dict(TSV_HEADER + api.GetTSVText(0), '\t', -1)
+
+    @staticmethod
+    def _as_uncompressed_image(image):
+        """
+        pytesseract writes its input to a temp file in the image's own format, PNG by default.
+        Tagging the image as PNM (PGM for grey images) skips the zlib compression, which costs
+        several times more than the raw write; Tesseract reads PNM natively.
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        if not image.format:
+            image.format = "PPM"
+        return image
 
     def extract_structured_data(self, image, psm: int = 7) -> dict:
         """Extracts structured word data from a pre-processed image using Tesseract."""
@@ -29,10 +129,14 @@ class TextParser:
             log.error("Cannot extract text from a None image.")
             return {}
         try:
-            
-            custom_config = f"--oem 3 --psm {psm}"
-            data = pytesseract.image_to_data(image, config=custom_config, output_type=Output.DICT)
-            log.debug(f"Extracted structured text data with {len(data.get('text', []))} potential words.")
+            # LSTM only, and skip the inverted-text retry pass: every image we send is already
+            # binarized to dark text on a white background.
+            if self._use_tesserocr:
+                data = self._image_to_data_in_process(image, psm)
+            else:
+                custom_config = tesseract_config(psm)
+                data = pytesseract.image_to_data(self._as_uncompressed_image(image), config=custom_config, output_type=Output.DICT)
+            log.debug("Extracted structured text data with %s potential words.", len(data.get('text', [])))
             return data
         except pytesseract.TesseractNotFoundError:
             log.error("Tesseract executable not found. Ensure it is installed and the path is configured correctly.")
@@ -41,37 +145,80 @@ class TextParser:
             log.error(f"An error occurred during OCR: {e}")
             return {}
 
-    def _filter_words_by_confidence(self, ocr_data: dict, min_confidence: int) -> list[dict]:
-        """Filters words from OCR data based on a minimum confidence score and returns structured data."""
-        if not ocr_data or not ocr_data.get('text'):
+    def extract_structured_data_stacked(self, images: list, psm: int = 6, separator_height: int = 20) -> list[dict]:
+        """
+        Runs a single Tesseract call over several pre-processed single-line images.
+
+        The images are stacked vertically on a white background (separated by blank rows),
+        OCR'd once, and the word data is split back out by each word's vertical position.
+
+        Returns:
+            A list of OCR data dicts, one per input image, in the same order.
+        """
+        if not images:
             return []
 
-        filtered_words = []
-        for i in range(len(ocr_data['text'])):
-            confidence = int(ocr_data['conf'][i])
-            text = ocr_data['text'][i].strip()
-            if text and confidence >= min_confidence:
-                filtered_words.append({
-                    'text': text,
-                    'left': int(ocr_data['left'][i]),
-                    'width': int(ocr_data['width'][i]),
-                    'line_num': int(ocr_data['line_num'][i]),
-                    'block_num': int(ocr_data['block_num'][i]),
-                    'conf': confidence
-                })
-        return filtered_words
+        width = max(image.shape[1] for image in images)
+        total_height = sum(image.shape[0] for image in images) + separator_height * (len(images) + 1)
+        stacked = np.full((total_height, width), 255, dtype=np.uint8)
+
+        row_bounds = []
+        y = separator_height
+        for image in images:
+            h, w = image.shape[:2]
+            stacked[y:y+h, :w] = image
+            row_bounds.append((y, y + h))
+            y += h + separator_height
+
+        ocr_data = self.extract_structured_data(stacked, psm=psm)
+        split_data = [{key: [] for key in ocr_data} for _ in images]
+        if not ocr_data:
+            return split_data
+
+        # Each image owns the band from half a separator above it to half a separator below.
+        # The bands are sorted and disjoint, so a binary search on their tops finds a word's image.
+        band_tops = [top - separator_height // 2 for top, _ in row_bounds]
+        band_bottoms = [bottom + separator_height // 2 for _, bottom in row_bounds]
+        columns = list(ocr_data.items())
+        for i in range(len(ocr_data.get('text', []))):
+            word_centre = ocr_data['top'][i] + ocr_data['height'][i] // 2
+            image_index = bisect.bisect_right(band_tops, word_centre) - 1
+            if image_index >= 0 and word_centre < band_bottoms[image_index]:
+                image_data = split_data[image_index]
+                for key, values in columns:
+                    image_data[key].append(values[i])
+
+        log.debug("Split stacked OCR data across %s images.", len(images))
+        return split_data
+
+    def _filter_words_by_confidence(self, ocr_data: dict, min_confidence: int) -> tuple[list[str], list[int]]:
+        """
+        Filters words from OCR data by a minimum confidence score.
+        Returns the stripped text and confidence of each kept word; nothing else is read.
+        """
+        if not ocr_data or not ocr_data.get('text'):
+            return [], []
+
+        words, confidences = [], []
+        for text, confidence in zip(ocr_data['text'], ocr_data['conf']):
+            confidence = int(confidence)
+            if confidence >= min_confidence:
+                text = text.strip()
+                if text:
+                    words.append(text)
+                    confidences.append(confidence)
+        return words, confidences
 
     def parse_as_single_phrase(self, ocr_data: dict, min_confidence: int, return_confidence: bool = False) -> Union[str, tuple[str, float]]:
         """Parses OCR data assuming it represents a single phrase (e.g., one ingredient name)."""
-        filtered_words = self._filter_words_by_confidence(ocr_data, min_confidence)
-        if not filtered_words:
+        words, confidences = self._filter_words_by_confidence(ocr_data, min_confidence)
+        if not words:
             return ("", 0.0) if return_confidence else ""
 
-        words = [word['text'] for word in filtered_words]
-        confidences = [word['conf'] for word in filtered_words]
-
-        result = " ".join(words)
-        log.debug(f"Parsed single phrase with min confidence {min_confidence}: '{result}'")
+        # OCR names come from a small vocabulary; interning makes repeat reads share one object,
+        # so later dict lookups and comparisons between them short-circuit on identity.
+        result = sys.intern(" ".join(words))
+        log.debug("Parsed single phrase with min confidence %s: '%s'", min_confidence, result)
         
         if return_confidence:
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
@@ -79,36 +226,49 @@ class TextParser:
         else:
             return result
 
-    def parse_as_ingredient_list(self, ocr_data: dict, min_confidence: int, return_confidence: bool = False) -> Union[list[str], list[tuple[str, float]]]:
-        """Parses structured OCR data, intelligently grouping words into distinct ingredients."""
-        words = self._filter_words_by_confidence(ocr_data, min_confidence)
-        if not words: return []
+    def _confident_word_indices(self, ocr_data: dict, min_confidence: int) -> tuple[np.ndarray, list[str]]:
+        """
+        Finds the words with non-blank text and confidence >= min_confidence using column arrays.
+        Returns their indices into ocr_data and the stripped text of every word.
+        """
+        if not ocr_data or not ocr_data.get('text'):
+            return np.empty(0, dtype=np.intp), []
 
-        horizontal_gap_threshold = self.config_manager.get_setting("bot_settings.panel_detection.horizontal_gap_threshold", default=30)
+        texts = [text.strip() for text in ocr_data['text']]
+        confidences = np.asarray(ocr_data['conf']).astype(np.int64)
+        has_text = np.fromiter(map(bool, texts), dtype=bool, count=len(texts))
+        return np.flatnonzero(has_text & (confidences >= min_confidence)), texts
 
-        words.sort(key=lambda w: (w['block_num'], w['line_num'], w['left']))
+    def parse_as_ingredient_list(self, ocr_data: dict, min_confidence: int, return_confidence: bool = False) -> Union[list[str], list[tuple[str, float]]]:
+        """Parses structured OCR data, intelligently grouping words into distinct ingredients."""
+        kept, texts = self._confident_word_indices(ocr_data, min_confidence)
+        if kept.size == 0: return []
 
-        results, current_words, current_confs = [], [words[0]['text']], [words[0]['conf']]
-        for i in range(1, len(words)):
-            prev_word, current_word = words[i-1], words[i]
-            same_line = current_word['block_num'] == prev_word['block_num'] and current_word['line_num'] == prev_word['line_num']
+        # Column arrays for the kept words, in reading order (block, line, left); lexsort is stable.
+        left = np.asarray(ocr_data['left']).astype(np.int64)[kept]
+        width = np.asarray(ocr_data['width']).astype(np.int64)[kept]
+        line = np.asarray(ocr_data['line_num']).astype(np.int64)[kept]
+        block = np.asarray(ocr_data['block_num']).astype(np.int64)[kept]
+        order = np.lexsort((left, line, block))
+        kept, left, width, line, block = kept[order], left[order], width[order], line[order], block[order]
 
-            if same_line and (current_word['left'] - (prev_word['left'] + prev_word['width'])) < horizontal_gap_threshold:
-                current_words.append(current_word['text'])
-                current_confs.append(current_word['conf'])
-            else:
-                self._add_phrase_to_results(results, current_words, current_confs, return_confidence)
-                current_words, current_confs = [current_word['text']], [current_word['conf']]
+        # A new ingredient starts on a new block or line, or after a wide horizontal gap.
+        gaps = left[1:] - (left[:-1] + width[:-1])
+        starts_new = (block[1:] != block[:-1]) | (line[1:] != line[:-1]) | (gaps >= self._horizontal_gap_threshold)
+        group_bounds = [0, *(np.flatnonzero(starts_new) + 1).tolist(), kept.size]
 
-        if current_words:
-            self._add_phrase_to_results(results, current_words, current_confs, return_confidence)
+        confidences = np.asarray(ocr_data['conf']).astype(np.int64)[kept].tolist()
+        words = [texts[i] for i in kept.tolist()]
+        results = []
+        for start, end in zip(group_bounds[:-1], group_bounds[1:]):
+            self._add_phrase_to_results(results, words[start:end], confidences[start:end], return_confidence)
 
-        log.debug(f"Parsed ingredient list with min confidence {min_confidence}: {results}")
+        log.debug("Parsed ingredient list with min confidence %s: %s", min_confidence, results)
         return results
 
     def _add_phrase_to_results(self, results: list, words: list, confs: list, return_confidence: bool):
         """Helper to construct and append a phrase to the results list."""
-        phrase = " ".join(words)
+        phrase = sys.intern(" ".join(words))
         if return_confidence:
             avg_conf = sum(confs) / len(confs) if confs else 0.0
             results.append((phrase, avg_conf))
@@ -0,0 +1,32 @@
+import ctypes
+import logging
+import sys
+import time
+
+log = logging.getLogger('csd2_bot')
+
+# Below this, time.sleep can't be trusted to wake up on time, so spin instead
+SPIN_THRESHOLD = 0.002
+
+def enable_high_resolution_timer():
+    """Raises the Windows timer resolution to 1 ms so short sleeps don't round up to ~15.6 ms."""
+    if sys.platform != "win32":
+        return
+    if ctypes.windll.winmm.timeBeginPeriod(1) != 0:
+        log.warning("Could not raise the system timer resolution.")
+
+def disable_high_resolution_timer():
+    """Restores the default Windows timer resolution."""
+    if sys.platform != "win32":
+        return
+    ctypes.windll.winmm.timeEndPeriod(1)
+
+def precise_sleep(seconds: float):
+    """Sleeps until a monotonic deadline, spinning for the last couple of milliseconds to avoid oversleeping."""
+    deadline = time.perf_counter() + seconds
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > SPIN_THRESHOLD:
+            time.sleep(remaining - SPIN_THRESHOLD)
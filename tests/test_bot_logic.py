@@ -5,7 +5,7 @@ from pathlib import Path
 # Add project root to the Python path to allow imports from src
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from src.bot_logic import map_ingredients_to_keys
+from src.bot_logic import map_ingredients_to_keys, _parse_step_for_action_and_count, _find_best_match
 
 # --- Test Data ---
 INPUT_KEYS = ["A", "S", "D", "F", "Z", "X", "C", "V"]
@@ -56,6 +56,32 @@ def test_no_matches_found():
     assert actual_matched == expected_matched
 
 
+def test_ingredient_beyond_input_keys_is_skipped():
+    """Tests that an ingredient in a slot with no input key is not matched."""
+    remaining_steps = ["Cheese", "Beef"]
+    available_on_page = ["Beef", "Buns", "Pickles", "Onions", "Tomato", "Lettuce", "Bacon", "Mayo", "Cheese"]
+    expected_keys = ["A"]
+    expected_matched = ["Beef"]
+
+    actual_keys, actual_matched = map_ingredients_to_keys(remaining_steps, available_on_page, INPUT_KEYS)
+
+    assert actual_keys == expected_keys
+    assert actual_matched == expected_matched
+
+
+def test_duplicate_ingredient_uses_first_slot():
+    """Tests that an ingredient shown twice on the page maps to its first slot."""
+    remaining_steps = ["Beef"]
+    available_on_page = ["Buns", "Beef", "Beef"]
+    expected_keys = ["S"]
+    expected_matched = ["Beef"]
+
+    actual_keys, actual_matched = map_ingredients_to_keys(remaining_steps, available_on_page, INPUT_KEYS)
+
+    assert actual_keys == expected_keys
+    assert actual_matched == expected_matched
+
+
 def test_empty_recipe():
     """Tests when the list of remaining steps is empty."""
     remaining_steps = []
@@ -67,3 +93,27 @@ def test_empty_recipe():
 
     assert actual_keys == expected_keys
     assert actual_matched == expected_matched
+
+
+@pytest.mark.parametrize("step, expected", [
+    ("Nuggets (4)", ("Nuggets", 4)),
+    ("Roll twice", ("Roll", 2)),
+    ("Cut eight times.", ("Cut", 8)),
+    ("Cut two  times", ("Cut", 2)),
+    ("Cut twotimes", ("Cut twotimes", 1)),
+    ("sometimes", ("sometimes", 1)),
+    ("twice", ("twice", 1)),
+])
+def test_parse_step_for_action_and_count(step, expected):
+    """Tests that counts are read from numbers in brackets and trailing number words only."""
+    assert _parse_step_for_action_and_count(step) == expected
+
+
+@pytest.mark.parametrize("target, options, expected_index", [
+    ("Ab", ["Ac", "Ad"], 0),
+    ("Bun", ["Bus", "Bug"], 0),
+    ("Beef", ["Bacon", "Beef", "Beef"], 1),
+])
+def test_find_best_match_ties_go_to_lowest_index(target, options, expected_index):
+    """Tests that options with equal scores resolve to the earliest one on the page."""
+    assert _find_best_match(target, options)['index'] == expected_index
@@ -1,5 +1,6 @@
 import logging
 import json
+import re
 from pathlib import Path
 import time
 from datetime import datetime
@@ -13,9 +14,17 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from src.ocr_processor import OcrProcessor
 from src.config_manager import ConfigManager
 from src.logger_setup import setup_logger
+from src.pixel_utils import color_within_tolerance
+from src.screen_capture import grab_raw
 
 log = logging.getLogger('csd2_bot')
 
+# Characters dropped from recipe names used in fixture paths: anything but letters, digits, space, '_' and '-'
+UNSAFE_NAME_CHARS = re.compile(r"[^\w _-]")
+
+# Shortest wait between trigger polls; the wait grows from here up to main_loop_delay
+TRIGGER_POLL_MIN_DELAY = 0.02
+
 
 class TestGenerator:
     """
@@ -49,7 +58,15 @@ class TestGenerator:
         self.trigger_y = trigger_config.get("check_pixel_y")
         self.expected_color = tuple(trigger_config.get("expected_color_rgb"))
         self.tolerance = trigger_config.get("tolerance", 10)
+        # Poll the trigger pixel with a 1x1 grab, not a full-screen screenshot
+        self._trigger_region = {'left': self.trigger_x, 'top': self.trigger_y, 'width': 1, 'height': 1}
         self.loop_delay = self.config.get_setting("bot_settings.main_loop_delay", default=1.0)
+        self.page_delay = self.config.get_setting("bot_settings.page_delay", 0.25)
+
+        # --- OCR Regions ---
+        self.recipe_roi = self.config.get_setting("ocr_regions.recipe_list_roi")
+        self.panel_roi = self.config.get_setting("ocr_regions.ingredient_panel_roi")
+        self.slot_rois = self.config.get_setting("ocr_regions.ingredient_slot_rois")
 
     def _reset_capture(self):
         """Resets all captured data for a new session."""
@@ -66,12 +83,8 @@ class TestGenerator:
         log.info(f"Press '{self.confirm_key}' to finish, '{self.page_turn_key}' to turn page, '{self.undo_key}' to undo last key.")
 
         # 1. Initial OCR
-        recipe_roi = self.config.get_setting("ocr_regions.recipe_list_roi")
-        panel_roi = self.config.get_setting("ocr_regions.ingredient_panel_roi")
-        slot_rois = self.config.get_setting("ocr_regions.ingredient_slot_rois")
-
-        self.full_recipe_steps = self.ocr.process_recipe_list_roi(recipe_roi)
-        page_1_ingredients = self.ocr.process_ingredient_panel_roi(panel_roi, slot_rois)
+        self.full_recipe_steps = self.ocr.process_recipe_list_roi(self.recipe_roi)
+        page_1_ingredients = self.ocr.process_ingredient_panel_roi(self.panel_roi, self.slot_rois)
         self.ingredient_pages_ocr.append(page_1_ingredients)
 
         log.info(f"Captured initial recipe: {self.full_recipe_steps}")
@@ -89,8 +102,16 @@ class TestGenerator:
     def _wait_for_recipe_trigger(self):
         """Waits for the pixel color that indicates a new recipe is available."""
         log.info("Waiting for a new recipe to start capture...")
-        while not pyautogui.pixelMatchesColor(self.trigger_x, self.trigger_y, self.expected_color, tolerance=self.tolerance):
-            time.sleep(self.loop_delay)
+        # Poll quickly at first, backing off to loop_delay, so a recipe that appears soon after
+        # the last one is caught without a full loop_delay of latency.
+        delay = min(TRIGGER_POLL_MIN_DELAY, self.loop_delay)
+        while True:
+            # grab_raw returns BGRA bytes
+            b, g, r, _ = grab_raw(self._trigger_region)[:4]
+            if color_within_tolerance((r, g, b), self.expected_color, self.tolerance):
+                break
+            time.sleep(delay)
+            delay = min(delay * 1.5, self.loop_delay)
         log.info("Recipe trigger detected. Starting capture process.")
 
     def run_loop(self):
@@ -133,11 +154,9 @@ class TestGenerator:
             log.info("Page turn detected. Capturing next ingredient panel.")
             self.key_presses_per_page.append([]) # Add a new page for keys
             # Give game time to animate page turn
-            time.sleep(self.config.get_setting("bot_settings.page_delay", 0.25))
+            time.sleep(self.page_delay)
             
-            panel_roi = self.config.get_setting("ocr_regions.ingredient_panel_roi")
-            slot_rois = self.config.get_setting("ocr_regions.ingredient_slot_rois")
-            next_page_ingredients = self.ocr.process_ingredient_panel_roi(panel_roi, slot_rois)
+            next_page_ingredients = self.ocr.process_ingredient_panel_roi(self.panel_roi, self.slot_rois)
             self.ingredient_pages_ocr.append(next_page_ingredients)
             log.info(f"Captured new page ingredients: {next_page_ingredients}")
 
@@ -167,9 +186,10 @@ class TestGenerator:
         log.info("Generating test files...")
 
         # Create a unique directory for this test run based on the recipe name and timestamp
-        first_step = self.full_recipe_steps[0] if self.full_recipe_steps else "unknown"
+        # full_recipe_steps holds one list of steps per page (plus extras), so take the first step on any page
+        first_step = next((step for page in self.full_recipe_steps for step in page), "unknown")
         # Sanitize recipe name for use in a directory path
-        sanitized_name = "".join(c for c in first_step if c.isalnum() or c in " _-").rstrip().replace(" ", "_").lower()
+        sanitized_name = UNSAFE_NAME_CHARS.sub("", first_step).rstrip().replace(" ", "_").lower()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         test_run_dir = Path(f"tests/fixtures/generated/{sanitized_name}_{timestamp}")
@@ -180,15 +200,20 @@ class TestGenerator:
             log.error(f"Failed to create test directory {test_run_dir}. Error: {e}")
             return
 
+        # full_recipe_steps is [page 1, page 2, page 3, extras]; the extra steps are done on the last page
+        page_steps, extra_steps = self.full_recipe_steps[:3], self.full_recipe_steps[3]
+        last_page_index = len(self.ingredient_pages_ocr) - 1
+
         for i, (page_ingredients, page_keys) in enumerate(zip(self.ingredient_pages_ocr, self.key_presses_per_page)):
             page_num = i + 1
-            is_last_page = page_num == len(self.ingredient_pages_ocr)
-            # For the current page, the required steps are the remainder of the full list
+            recipe_steps = page_steps[i] if i < len(page_steps) else []
+            if i == last_page_index:
+                recipe_steps = recipe_steps + extra_steps
 
             test_case_data = {
                 "description": f"Test case for '{first_step}', page {page_num}",
                 "input": {
-                    "recipe_steps": self.full_recipe_steps[i] + (self.full_recipe_steps[3] if is_last_page else []),
+                    "recipe_steps": recipe_steps,
                     "available_on_page": page_ingredients
                 },
                 "expected": {"keys_to_press": page_keys}
@@ -200,7 +225,6 @@ class TestGenerator:
                 json.dump(test_case_data, f, indent=4)
             log.info(f"Successfully generated test file: {file_path}")
 
-            # Update the count of processed steps for the next iteration
 
 if __name__ == "__main__":
     config_manager = ConfigManager()
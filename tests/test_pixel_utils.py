@@ -0,0 +1,32 @@
+import pytest
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Add project root to the Python path to allow imports from src
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.pixel_utils import saturation
+
+
+@pytest.mark.parametrize("bgr", [
+    (0, 0, 0),
+    (255, 255, 255),
+    (54, 54, 54),
+    (0, 0, 255),
+    (1, 0, 0),
+    (1, 2, 3),
+    (10, 200, 37),
+    (128, 127, 129),
+    (254, 0, 255),
+    (33, 66, 99),
+    (250, 245, 240),
+])
+def test_saturation_matches_opencv(bgr):
+    """Tests that saturation() gives the same value as OpenCV's 8-bit BGR -> HSV conversion."""
+    pixel = np.array([[bgr]], dtype=np.uint8)
+    expected = int(cv2.cvtColor(pixel, cv2.COLOR_BGR2HSV)[0, 0, 1])
+
+    assert saturation(*bgr) == expected